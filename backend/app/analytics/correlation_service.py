@@ -1,8 +1,15 @@
+import asyncio
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from scipy.stats import pearsonr
+import scipy
+from scipy.stats import pearsonr, t as t_dist
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, delete, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime, timedelta
 from typing import List, Dict, Tuple, Optional
 from ..models import LogEntry, CorrelationInsight, User
@@ -11,6 +18,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# scipy >= 1.14 vectorises pearsonr along an axis; older releases use _p_values instead
+_PEARSONR_HAS_AXIS = tuple(int(part) for part in scipy.__version__.split('.')[:2]) >= (1, 14)
+
 class CorrelationService:
     """Service for computing correlations between user metrics."""
     
@@ -18,32 +28,29 @@ class CorrelationService:
         self.db = db
     
     def get_user_data_as_dataframe(self, user_id: str, days_back: int = 90) -> pd.DataFrame:
-        """Get user log entries as a pandas DataFrame for analysis."""
+        """Get the user's daily per-metric means as a pandas DataFrame for analysis."""
         cutoff_date = datetime.now().date() - timedelta(days=days_back)
         
-        # Get all log entries for the user within the time period
-        stmt = select(LogEntry).where(
+        # Let Postgres average each day's (domain, metric) values, so only one row per
+        # day and metric is transferred; the covering (user_id, date, domain, metric)
+        # INCLUDE (value) index serves this as an index-only scan
+        stmt = select(
+            LogEntry.date,
+            LogEntry.domain,
+            LogEntry.metric,
+            func.avg(LogEntry.value),
+        ).where(
             LogEntry.user_id == user_id,
             LogEntry.date >= cutoff_date
-        ).order_by(LogEntry.date)
+        ).group_by(LogEntry.date, LogEntry.domain, LogEntry.metric).order_by(LogEntry.date)
         
-        entries = self.db.execute(stmt).scalars().all()
+        rows = self.db.execute(stmt).all()
         
-        if not entries:
+        if not rows:
             return pd.DataFrame()
         
-        # Convert to DataFrame
-        data = []
-        for entry in entries:
-            data.append({
-                'date': entry.date,
-                'domain': entry.domain.value,
-                'metric': entry.metric,
-                'value': entry.value,
-                'notes': entry.notes
-            })
-        
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(rows, columns=['date', 'domain', 'metric', 'value'])
+        df['domain'] = [domain.value for domain in df['domain']]
         return df
     
     def compute_correlations(self, user_id: str) -> List[Dict]:
@@ -54,55 +61,108 @@ class CorrelationService:
             logger.info(f"No data found for user {user_id}")
             return []
         
-        # Pivot data to get metrics as columns
-        # Group by date and domain-metric combination
-        df['metric_key'] = df['domain'] + '_' + df['metric']
+        # Dense (dates x metric keys) matrix of daily means, forward filled
+        values, metric_keys = self._dense_pivot(df)
         
-        # Create pivot table with date as index and metric_key as columns
-        pivot_df = df.pivot_table(
-            index='date',
-            columns='metric_key',
-            values='value',
-            aggfunc='mean'  # Average multiple entries per day
-        ).fillna(method='ffill').fillna(0)  # Forward fill and fill remaining NaN with 0
-        
-        if pivot_df.shape[1] < 2:
+        if values.shape[1] < 2:
             logger.info(f"Not enough different metrics for user {user_id} to compute correlations")
             return []
         
-        correlations = []
+        n = values.shape[0]
+        if n < 5:  # Need at least 5 data points
+            return []
+        
+        r_matrix = self._pearson_matrix(values)
         
-        # Compute correlations between all pairs of metrics
-        for i, col1 in enumerate(pivot_df.columns):
-            for col2 in pivot_df.columns[i+1:]:
-                try:
-                    # Remove rows where either column has NaN values
-                    clean_data = pivot_df[[col1, col2]].dropna()
-                    
-                    if len(clean_data) < 5:  # Need at least 5 data points
-                        continue
-                    
-                    # Compute Pearson correlation
-                    corr_coef, p_value = pearsonr(clean_data[col1], clean_data[col2])
-                    
-                    # Only include significant correlations (p < 0.05) and moderate strength (|r| > 0.3)
-                    if p_value < 0.05 and abs(corr_coef) > 0.3:
-                        correlation_info = {
-                            'metric1': col1,
-                            'metric2': col2,
-                            'correlation_coefficient': corr_coef,
-                            'p_value': p_value,
-                            'data_points': len(clean_data),
-                            'description': self._generate_correlation_description(col1, col2, corr_coef)
-                        }
-                        correlations.append(correlation_info)
-                        
-                except Exception as e:
-                    logger.warning(f"Error computing correlation between {col1} and {col2}: {e}")
-                    continue
+        # Only moderate strength pairs (|r| > 0.3) need a p-value; NaN compares False
+        with np.errstate(invalid='ignore'):
+            candidates = np.argwhere(np.triu(np.abs(r_matrix) > 0.3, k=1))
+        if len(candidates) == 0:
+            return []
+        rows, cols = candidates[:, 0], candidates[:, 1]
+        if _PEARSONR_HAS_AXIS:
+            result = pearsonr(values[:, rows], values[:, cols], axis=0)
+            r_values, p_values = result.statistic, result.pvalue
+        else:
+            r_values = r_matrix[rows, cols]
+            p_values = self._p_values(r_values, n)
+        
+        # Of those, only include significant correlations (p < 0.05)
+        correlations = []
+        for (i, j), corr_coef, p_value in zip(candidates, r_values, p_values):
+            if not p_value < 0.05:
+                continue
+            col1, col2 = metric_keys[i], metric_keys[j]
+            corr_coef = float(corr_coef)
+            correlations.append({
+                'metric1': col1,
+                'metric2': col2,
+                'correlation_coefficient': corr_coef,
+                'p_value': float(p_value),
+                'data_points': n,
+                'description': self._generate_correlation_description(col1, col2, corr_coef)
+            })
         
         return correlations
     
+    @staticmethod
+    def _dense_pivot(df: pd.DataFrame) -> Tuple[np.ndarray, List[str]]:
+        """
+        Pivot log rows into a C-contiguous (n_dates x n_metrics) float64 matrix.
+        
+        Multiple entries for the same day are averaged, missing days are
+        forward filled from the previous logged day, and anything before a
+        metric's first entry is 0. Rows are sorted by date and columns by
+        ``domain_metric`` key, as ``pivot_table`` would produce.
+        """
+        metric_keys, metric_ids = np.unique(
+            (df['domain'] + '_' + df['metric']).to_numpy(dtype=str), return_inverse=True
+        )
+        _, date_ids = np.unique(df['date'].to_numpy(dtype='datetime64[D]'), return_inverse=True)
+        n_dates = date_ids.max() + 1
+        
+        sums = np.zeros((n_dates, len(metric_keys)))
+        counts = np.zeros_like(sums)
+        np.add.at(sums, (date_ids, metric_ids), df['value'].to_numpy(dtype=np.float64))
+        np.add.at(counts, (date_ids, metric_ids), 1)
+        means = sums / np.maximum(counts, 1)
+        
+        # Index of the most recent row with data for each cell, -1 before the first one
+        last_seen = np.where(counts > 0, np.arange(n_dates)[:, None], -1)
+        np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+        filled = np.take_along_axis(means, np.maximum(last_seen, 0), axis=0)
+        filled[last_seen < 0] = 0.0
+        
+        return np.ascontiguousarray(filled), metric_keys.tolist()
+    
+    @staticmethod
+    def _pearson_matrix(values: np.ndarray) -> np.ndarray:
+        """
+        Compute all pairwise Pearson coefficients at once.
+        
+        Columns are mean-centred and L2-normalised so the full correlation
+        matrix is a single ``X.T @ X`` product. Zero-variance columns get NaN
+        coefficients, matching what ``pearsonr`` reports.
+        """
+        centered = values - values.mean(axis=0)
+        norms = np.linalg.norm(centered, axis=0)
+        constant = norms == 0
+        norms[constant] = 1.0
+        normalized = centered / norms
+        
+        r_matrix = np.clip(normalized.T @ normalized, -1.0, 1.0)
+        r_matrix[constant, :] = np.nan
+        r_matrix[:, constant] = np.nan
+        return r_matrix
+    
+    @staticmethod
+    def _p_values(r: np.ndarray, n: int) -> np.ndarray:
+        """Two-sided p-values for Pearson coefficients ``r`` over ``n`` observations."""
+        # t-statistic with n - 2 degrees of freedom; |r| == 1 gives p == 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_stat = r * np.sqrt((n - 2) / (1.0 - r ** 2))
+        return 2 * t_dist.sf(np.abs(t_stat), n - 2)
+    
     def _generate_correlation_description(self, metric1: str, metric2: str, corr_coef: float) -> str:
         """Generate a human-readable description of the correlation."""
         strength = "strong" if abs(corr_coef) > 0.7 else "moderate" if abs(corr_coef) > 0.5 else "weak"
@@ -115,48 +175,93 @@ class CorrelationService:
         return f"{strength.title()} {direction} correlation ({corr_coef:.2f}) between {m1_clean} and {m2_clean}"
     
     def save_correlation_insights(self, user_id: str, correlations: List[Dict]) -> None:
-        """Save correlation insights to the database."""
-        # Clear existing insights for this user
-        self.db.query(CorrelationInsight).filter(CorrelationInsight.user_id == user_id).delete()
-        
-        # Save new insights
-        for corr in correlations:
-            insight = CorrelationInsight(
-                user_id=user_id,
-                description=corr['description'],
-                correlation_score=corr['correlation_coefficient']
-            )
-            self.db.add(insight)
+        """Upsert correlation insights, one row per metric pair, and drop pairs no longer found."""
+        # Insights for pairs that are no longer significant, or with no pair key, are stale
+        stale = delete(CorrelationInsight).where(CorrelationInsight.user_id == user_id)
+        if not correlations:
+            self.db.execute(stale)
+            self.db.commit()
+            logger.info(f"No significant correlations for user {user_id}; cleared existing insights")
+            return
+        
+        rows = [
+            {
+                # Explicit ids: a multi-row VALUES insert only fills the Python-side default once
+                'id': uuid.uuid4(),
+                'user_id': user_id,
+                'metric_pair_key': '~'.join(sorted((corr['metric1'], corr['metric2']))),
+                'description': corr['description'],
+                'correlation_score': corr['correlation_coefficient']
+            }
+            for corr in correlations
+        ]
+        stmt = pg_insert(CorrelationInsight).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'metric_pair_key'],
+            set_={
+                'description': stmt.excluded.description,
+                'correlation_score': stmt.excluded.correlation_score,
+                'created_at': func.now(),
+            },
+        )
+        self.db.execute(stmt)
+        
+        # Remove the stale insights in the same transaction
+        pair_keys = [row['metric_pair_key'] for row in rows]
+        self.db.execute(stale.where(
+            or_(CorrelationInsight.metric_pair_key.is_(None), CorrelationInsight.metric_pair_key.not_in(pair_keys))
+        ))
         
         self.db.commit()
         logger.info(f"Saved {len(correlations)} correlation insights for user {user_id}")
     
-    def run_weekly_analysis(self) -> None:
-        """Run weekly correlation analysis for all users."""
+    async def run_weekly_analysis(self) -> None:
+        """Run weekly correlation analysis for all users, in parallel across processes."""
         logger.info("Starting weekly correlation analysis")
         
         # Get all users
-        users = self.db.query(User).all()
-        
-        for user in users:
-            try:
-                logger.info(f"Computing correlations for user {user.id}")
-                correlations = self.compute_correlations(str(user.id))
-                self.save_correlation_insights(str(user.id), correlations)
-            except Exception as e:
-                logger.error(f"Error processing user {user.id}: {e}")
-                continue
+        user_ids = [str(user_id) for user_id in self.db.execute(select(User.id)).scalars().all()]
+        
+        loop = asyncio.get_running_loop()
+        
+        def submit(pool: ProcessPoolExecutor, user_id: str) -> asyncio.Future:
+            logger.info(f"Computing correlations for user {user_id}")
+            return loop.run_in_executor(pool, _process_user, user_id)
+        
+        # Spawn rather than fork so children don't inherit the API's event loop or DB pool;
+        # max_workers bounds how many users are processed at once
+        with ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = await asyncio.gather(
+                *(submit(pool, user_id) for user_id in user_ids),
+                return_exceptions=True
+            )
+        
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing user {user_id}: {result}")
         
         logger.info("Weekly correlation analysis completed")
 
 
-def run_weekly_correlation_analysis():
+def _process_user(user_id: str) -> None:
+    """Compute and store one user's correlations; runs in a worker process with its own session."""
+    from ..db import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        service = CorrelationService(db)
+        service.save_correlation_insights(user_id, service.compute_correlations(user_id))
+    finally:
+        db.close()
+
+
+async def run_weekly_correlation_analysis():
     """Function to be called by the background task scheduler."""
     from ..db import SessionLocal
     
     db = SessionLocal()
     try:
         service = CorrelationService(db)
-        service.run_weekly_analysis()
+        await service.run_weekly_analysis()
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
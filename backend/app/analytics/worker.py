@@ -1,17 +1,45 @@
 import asyncio
+from itertools import groupby
+from operator import attrgetter
 from datetime import date, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, insert
 from ..db import SessionLocal
 from ..models import LogEntry, CorrelationInsight
-from ..core.config import settings
+from ..core.config import get_settings
 import numpy as np
 import httpx
 
+settings = get_settings()
 
-async def generate_summary(text: str) -> str:
+try:
+	import numba
+except ImportError:  # numba is optional; fall back to the numpy kernel below
+	numba = None
+
+MIN_PAIRS = 3
+
+# Shared OpenAI client: HTTP/2 plus keepalive so summaries reuse one TLS connection.
+# It is bound to the event loop that first uses it, so _summarize_all closes it on exit.
+_client: httpx.AsyncClient | None = None
+
+
+def _get_client() -> httpx.AsyncClient:
+	global _client
+	if _client is None or _client.is_closed:
+		_client = httpx.AsyncClient(
+			base_url=settings.openai_api_base,
+			timeout=60,
+			http2=True,
+			limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30),
+		)
+	return _client
+
+
+async def generate_summary(text: str, client: httpx.AsyncClient | None = None) -> str | None:
+	"""Summarize journal text into a weekly insight; None when no API key is configured."""
 	if not settings.openai_api_key:
-		return "No API key configured; summary unavailable."
+		return None
 	headers = {
 		"Authorization": f"Bearer {settings.openai_api_key}",
 		"Content-Type": "application/json",
@@ -23,77 +51,148 @@ async def generate_summary(text: str) -> str:
 			{"role": "user", "content": f"Summarize these entries:\n{text}"},
 		],
 	}
-	async with httpx.AsyncClient(base_url=settings.openai_api_base, timeout=60) as client:
-		resp = await client.post("/chat/completions", headers=headers, json=payload)
-		resp.raise_for_status()
-		data = resp.json()
-		return data["choices"][0]["message"]["content"].strip()
+	client = client or _get_client()
+	resp = await client.post("/chat/completions", headers=headers, json=payload)
+	resp.raise_for_status()
+	data = resp.json()
+	return data["choices"][0]["message"]["content"].strip()
 
 
-def compute_correlations(pairs: list[tuple[float, float]]) -> float | None:
-	if len(pairs) < 3:
-		return None
-	x = np.array([p[0] for p in pairs], dtype=float)
-	y = np.array([p[1] for p in pairs], dtype=float)
-	if np.std(x) == 0 or np.std(y) == 0:
-		return None
-	r = float(np.corrcoef(x, y)[0, 1])
+async def _summarize_all(texts: list[str], concurrency: int = 10) -> list[str | None]:
+	"""Summarize every text on one event loop and one pooled client; failures become None."""
+	semaphore = asyncio.Semaphore(concurrency)
+	async with _get_client() as client:
+		async def summarize(text: str) -> str | None:
+			async with semaphore:
+				try:
+					return await generate_summary(text, client)
+				except Exception:
+					return None
+		return await asyncio.gather(*(summarize(text) for text in texts))
+
+
+def _pairwise_pearson_numpy(stacked: np.ndarray, mask: np.ndarray) -> np.ndarray:
+	"""Pairwise Pearson r over the days both rows are valid; NaN where undefined."""
+	m = mask.astype(np.float64)
+	x = np.where(mask, stacked, 0.0)
+	n = m @ m.T
+	sx = x @ m.T  # sum of row i over the days row j is also valid
+	sxx = (x * x) @ m.T
+	with np.errstate(divide="ignore", invalid="ignore"):
+		mean_x = sx / n
+		cov = x @ x.T - mean_x * sx.T
+		var = sxx - mean_x * sx
+		# Treat cancellation-level variance as a constant series
+		var = np.where(var <= 1e-12 * sxx, 0.0, var)
+		r = cov / np.sqrt(var * var.T)
+	r[(n < MIN_PAIRS) | (var == 0) | (var.T == 0)] = np.nan
+	r[np.tril_indices_from(r)] = np.nan
 	return r
 
 
+if numba is not None:
+	@numba.njit(cache=True, parallel=True)
+	def pairwise_pearson(stacked: np.ndarray, mask: np.ndarray) -> np.ndarray:
+		"""Pairwise Pearson r over the days both rows are valid; NaN where undefined."""
+		n_rows, n_days = stacked.shape
+		out = np.full((n_rows, n_rows), np.nan)
+		for i in numba.prange(n_rows):
+			for j in range(i + 1, n_rows):
+				n = 0
+				sx = 0.0
+				sy = 0.0
+				for k in range(n_days):
+					if mask[i, k] and mask[j, k]:
+						n += 1
+						sx += stacked[i, k]
+						sy += stacked[j, k]
+				if n < MIN_PAIRS:
+					continue
+				mx = sx / n
+				my = sy / n
+				sxx = 0.0
+				syy = 0.0
+				sxy = 0.0
+				for k in range(n_days):
+					if mask[i, k] and mask[j, k]:
+						dx = stacked[i, k] - mx
+						dy = stacked[j, k] - my
+						sxx += dx * dx
+						syy += dy * dy
+						sxy += dx * dy
+				if sxx == 0.0 or syy == 0.0:
+					continue
+				out[i, j] = sxy / np.sqrt(sxx * syy)
+		return out
+else:
+	pairwise_pearson = _pairwise_pearson_numpy
+
+
 def run_once():
 	db: Session = SessionLocal()
 	try:
+		# Determine last 7 days window
+		end = date.today()
+		start = end - timedelta(days=6)
+		# Fetch every user's logs for the window in one query, ordered so they can be grouped per user
+		# Plain column rows skip ORM hydration and the identity map
+		stmt = (
+			select(LogEntry.user_id, LogEntry.date, LogEntry.domain, LogEntry.value, LogEntry.notes)
+			.where(LogEntry.date >= start, LogEntry.date <= end)
+			.order_by(LogEntry.user_id, LogEntry.date)
+			.execution_options(stream_results=True, yield_per=1000)
+		)
+		# Stream rows from a server-side cursor; groupby consumes them one user at a time
+		rows = db.execute(stmt)
+		insights: list[dict] = []
+		summary_requests: list[tuple] = []
 		# For each user-week compute correlations across domains
-		users_dates = db.execute(select(LogEntry.user_id, LogEntry.date)).all()
-		user_ids = list({u for u, _ in users_dates})
-		for user_id in user_ids:
-			# Determine last 7 days window
-			end = date.today()
-			start = end - timedelta(days=6)
-			logs = db.execute(
-				select(LogEntry).where(LogEntry.user_id == user_id, LogEntry.date >= start, LogEntry.date <= end)
-			).scalars().all()
-			# Build domain -> date -> value mapping
-			domain_to_values: dict[str, dict[date, float]] = {}
-			for log in logs:
-				if log.value is None:
-					continue
-				domain_to_values.setdefault(log.domain.value, {})[log.date] = float(log.value)
-			# Compute pairwise correlations
-			domains = list(domain_to_values.keys())
-			correlations: dict[str, float] = {}
-			for i in range(len(domains)):
-				for j in range(i + 1, len(domains)):
-					d1, d2 = domains[i], domains[j]
-					pairs = []
-					for d in (start + timedelta(days=k) for k in range(7)):
-						if d in domain_to_values[d1] and d in domain_to_values[d2]:
-							pairs.append((domain_to_values[d1][d], domain_to_values[d2][d]))
-					r = compute_correlations(pairs)
-					if r is not None:
-						correlations[f"{d1}~{d2}"] = r
+		for user_id, group in groupby(rows, key=attrgetter("user_id")):
+			logs = list(group)
+			# Scatter values straight into a preallocated (domains x 7 days) matrix
+			valued = [log for log in logs if log.value is not None]
+			domains = list(dict.fromkeys(log.domain.value for log in valued))
+			domain_index = {d: i for i, d in enumerate(domains)}
+			stacked = np.zeros((len(domains), 7))
+			mask = np.zeros((len(domains), 7), dtype=np.bool_)
+			for log in valued:
+				i, k = domain_index[log.domain.value], (log.date - start).days
+				stacked[i, k] = log.value
+				mask[i, k] = True
+			# Compute pairwise correlations over the matrix in one call
+			# Only the upper triangle holds coefficients; NaN elsewhere and for undefined pairs
+			r_matrix = pairwise_pearson(stacked, mask)
 			# Summarize journal entries
 			journals = [l.notes for l in logs if l.domain.value == "reflection" and l.notes]
 			summary_text = "\n\n".join(journals)
-			if summary_text:
-				try:
-					summary = asyncio.run(generate_summary(summary_text))
-				except Exception:
-					summary = None
-			else:
-				summary = None
-			# Create correlation insight
-			if correlations:
-				for correlation_key, correlation_score in correlations.items():
-					description = f"Correlation between {correlation_key.replace('~', ' and ')}: {correlation_score:.3f}"
-					insight = CorrelationInsight(
-						user_id=user_id,
-						description=description,
-						correlation_score=correlation_score
-					)
-					db.add(insight)
-			db.commit()
+			# Without an API key there is nothing to summarize with; skip the requests entirely
+			if summary_text and settings.openai_api_key:
+				summary_requests.append((user_id, summary_text))
+			# Create correlation insight, stringifying domain names only for defined pairs
+			for i, j in np.argwhere(~np.isnan(r_matrix)):
+				correlation_score = float(r_matrix[i, j])
+				description = f"Correlation between {domains[i]} and {domains[j]}: {correlation_score:.3f}"
+				insights.append({
+					"user_id": user_id,
+					"description": description,
+					"correlation_score": correlation_score,
+				})
+		# Summarize all users' journals concurrently on a single event loop
+		if summary_requests:
+			results = asyncio.run(_summarize_all([text for _, text in summary_requests]))
+			summaries = {user_id: summary for (user_id, _), summary in zip(summary_requests, results)}
+			# Second pass: attach each user's weekly summary to their insights; failed summaries are None
+			for insight in insights:
+				summary = summaries.get(insight["user_id"])
+				if summary:
+					insight["description"] = f"{insight['description']}\nWeekly summary: {summary}"
+		# Persist every user's insights with one batched INSERT in a single transaction
+		if insights:
+			db.execute(insert(CorrelationInsight), insights)
+		db.commit()
+	except Exception:
+		db.rollback()
+		raise
 	finally:
 		db.close()
 
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..db import get_db
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from ..db import get_async_db
 from .. import services
 from ..core.auth import get_current_user, create_access_token
 from ..models import User
@@ -14,74 +16,74 @@ api_router = APIRouter()
 
 # Authentication routes
 @api_router.post("/register", response_model=UserRead)
-def register_user(payload: UserRegister, db: Session = Depends(get_db)):
+async def register_user(payload: UserRegister, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     try:
-        user = services.create_user(db, payload)
+        user = await services.create_user(db, payload)
         return user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @api_router.post("/login", response_model=Token)
-def login_user(payload: UserLogin, db: Session = Depends(get_db)):
+async def login_user(payload: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user and return JWT token."""
-    user = services.authenticate_user(db, payload.email, payload.password)
-    if not user:
+    user_id = await services.authenticate_user(db, payload.email, payload.password)
+    if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(data={"sub": str(user.id)})
+    access_token = create_access_token(data={"sub": str(user_id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Protected routes (require authentication)
 @api_router.post("/log", response_model=LogEntryRead)
-def add_log_entry(
+async def add_log_entry(
     payload: LogEntryCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a log entry for the current user."""
-    log_entry = services.create_log_entry(db, str(current_user.id), payload)
+    log_entry = await services.create_log_entry(db, str(current_user.id), payload)
     return log_entry
 
 @api_router.get("/logs", response_model=list[LogEntryRead])
-def get_user_logs(
+async def get_user_logs(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all log entries for the current user."""
-    return services.get_logs_for_user(db, str(current_user.id))
+    return await services.get_logs_for_user(db, str(current_user.id))
 
 @api_router.post("/journal", response_model=JournalEntryRead)
-def submit_journal_entry(
+async def submit_journal_entry(
     payload: JournalEntryCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit a journal entry (stored as LogEntry with domain=reflection)."""
-    journal_entry = services.create_journal_entry(db, str(current_user.id), payload)
+    journal_entry = await services.create_journal_entry(db, str(current_user.id), payload)
     return journal_entry
 
 @api_router.get("/insights", response_model=list[CorrelationInsightRead])
-def get_user_insights(
+async def get_user_insights(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get correlation insights for the current user."""
-    return services.get_correlation_insights_for_user(db, str(current_user.id))
+    return await services.get_correlation_insights_for_user(db, str(current_user.id))
 
 @api_router.post("/analyze-correlations")
-def analyze_correlations(
+async def analyze_correlations(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Trigger correlation analysis for the current user."""
     try:
         from ..scripts.correlation_analysis import run_correlation_analysis
-        results = run_correlation_analysis(current_user.id)
+        results = await run_in_threadpool(run_correlation_analysis, current_user.id)
         return {
             "message": "Correlation analysis completed successfully",
             "user_id": str(current_user.id),
@@ -94,14 +96,14 @@ def analyze_correlations(
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @api_router.post("/journal/summarize", response_model=JournalSummaryRead)
-def create_journal_summary(
+async def create_journal_summary(
     payload: JournalSummaryCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a journal summary using AI."""
     try:
-        journal_summary = services.create_journal_summary(
+        journal_summary = await services.create_journal_summary(
             db, str(current_user.id), payload.date, payload.text
         )
         return journal_summary
@@ -111,50 +113,63 @@ def create_journal_summary(
         raise HTTPException(status_code=500, detail=f"Failed to create summary: {str(e)}")
 
 @api_router.get("/journal/summaries", response_model=list[JournalSummaryRead])
-def get_journal_summaries(
+async def get_journal_summaries(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all journal summaries for the current user."""
-    return services.get_journal_summaries_for_user(db, str(current_user.id))
+    return await services.get_journal_summaries_for_user(db, str(current_user.id))
 
 @api_router.get("/ai-insights", response_model=AIInsightsResponse)
-def get_ai_coach_insights(
+async def get_ai_coach_insights(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate AI coach insights based on user data and correlations."""
     try:
-        logs = services.get_logs_for_user(db, str(current_user.id))
-        correlations = services.get_correlation_insights_for_user(db, str(current_user.id))
+        logs = await services.get_recent_logs_for_user(db, str(current_user.id))
+        correlations = await services.get_correlation_insights_for_user(db, str(current_user.id))
         
-        insights = services.generate_ai_coach_insights(logs, correlations)
+        insights = await services.generate_ai_coach_insights_async(logs, correlations)
         return AIInsightsResponse(insights=insights)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate insights: {str(e)}")
 
+@api_router.get("/ai-insights/stream")
+async def stream_ai_coach_insights(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream AI coach insights as plain text while the model generates them."""
+    logs = await services.get_recent_logs_for_user(db, str(current_user.id))
+    correlations = await services.get_correlation_insights_for_user(db, str(current_user.id))
+    return StreamingResponse(
+        services.stream_ai_coach_insights(logs, correlations),
+        media_type="text/plain"
+    )
+
 # Legacy routes for backward compatibility
 @api_router.post("/users", response_model=UserRead)
-def create_user(payload, db: Session = Depends(get_db)):
-    user = services.create_user(db, payload)
+async def create_user(payload, db: AsyncSession = Depends(get_async_db)):
+    user = await services.create_user(db, payload)
     return user
 
 @api_router.get("/users/me", response_model=UserRead)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information."""
     return current_user
 
 @api_router.get("/users/{user_id}", response_model=UserRead)
-def get_user(user_id: str, db: Session = Depends(get_db)):
-    user = services.get_user(db, user_id)
+async def get_user(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    user = await services.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @api_router.post("/logs", response_model=LogEntryRead)
-def create_log(payload, db: Session = Depends(get_db)):
-    return services.create_log(db, payload)
+async def create_log(payload, db: AsyncSession = Depends(get_async_db)):
+    return await services.create_log(db, payload)
 
 @api_router.get("/logs/{user_id}", response_model=list[LogEntryRead])
-def get_logs(user_id: str, db: Session = Depends(get_db)):
-    return services.get_logs_for_user(db, user_id) 
\ No newline at end of file
+async def get_logs(user_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await services.get_logs_for_user(db, user_id) 
\ No newline at end of file
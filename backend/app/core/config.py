@@ -1,5 +1,9 @@
+from functools import lru_cache
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-import secrets
+
+# HS256 wants a key of at least 256 bits; token_urlsafe(32) yields 43 characters
+MIN_SECRET_KEY_LENGTH = 32
 
 class Settings(BaseSettings):
 	database_url: str = "postgresql+psycopg2://crosscoach:crosscoach@db:5432/crosscoach"
@@ -11,12 +15,25 @@ class Settings(BaseSettings):
 	openai_model: str = "gpt-4o-mini"
 	
 	# JWT Settings
-	secret_key: str = secrets.token_urlsafe(32)
+	# Required so tokens stay valid across restarts and between processes
+	secret_key: str
 	algorithm: str = "HS256"
 	access_token_expire_minutes: int = 30
 
+	@field_validator("secret_key")
+	@classmethod
+	def _check_secret_key(cls, value: str) -> str:
+		# An empty SECRET_KEY= line passes as "set", so reject blank and short keys explicitly
+		if len(value.strip()) < MIN_SECRET_KEY_LENGTH:
+			raise ValueError(f"SECRET_KEY must be at least {MIN_SECRET_KEY_LENGTH} non-blank characters")
+		return value
+
 	class Config:
 		env_file = ".env"
 		env_file_encoding = "utf-8"
+		frozen = True
+
 
-settings = Settings() 
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+	return Settings()
@@ -31,9 +31,8 @@ class BackgroundScheduler:
         """Run correlation analysis asynchronously."""
         try:
             logger.info("Starting scheduled correlation analysis")
-            # Run in thread pool since the analysis is CPU-intensive
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, run_weekly_correlation_analysis)
+            # Per-user work is fanned out to a process pool inside the analysis
+            await run_weekly_correlation_analysis()
             logger.info("Scheduled correlation analysis completed")
         except Exception as e:
             logger.error(f"Error in scheduled correlation analysis: {e}")
@@ -51,4 +50,19 @@ class BackgroundScheduler:
             logger.info("Background scheduler shutdown")
 
 # Global scheduler instance
-scheduler = BackgroundScheduler() 
\ No newline at end of file
+scheduler = BackgroundScheduler()
+
+
+async def _serve():
+    """Run the scheduler on this process's event loop until it is stopped."""
+    scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    # Runs as its own service so the weekly job never shares CPU with the API
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve())
@@ -1,10 +1,24 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
 from sqlalchemy.orm import sessionmaker
-from .core.config import settings
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from .core.config import get_settings
 
-engine = create_engine(settings.database_url, pool_pre_ping=True)
+settings = get_settings()
+
+# Sync engine for the scheduler, analytics worker and scripts
+# values_plus_batch also batches executemany UPDATE/DELETE through psycopg2's execute_batch
+engine = create_engine(settings.database_url, pool_pre_ping=True, executemany_mode="values_plus_batch")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Async engine for the API request handlers
+async_engine = create_async_engine(
+	make_url(settings.database_url).set(drivername="postgresql+asyncpg"),
+	pool_size=20,
+	max_overflow=10,
+	pool_pre_ping=True,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
 	from sqlalchemy.orm import Session
@@ -12,4 +26,9 @@ def get_db():
 		db: Session = SessionLocal()
 		yield db
 	finally:
-		db.close() 
\ No newline at end of file
+		db.close()
+
+
+async def get_async_db():
+	async with AsyncSessionLocal() as db:
+		yield db
@@ -1,10 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .core.config import settings
+from .core.config import get_settings
 from .api.routes import api_router
-from .db import engine
+from .db import engine, SessionLocal
 from .models import Base
-from .core.scheduler import scheduler
+from .services import (
+    migrate_log_entry_indexes,
+    migrate_journal_summary_content_hash,
+    migrate_correlation_insight_pair_key,
+)
+
+settings = get_settings()
 
 app = FastAPI(title="CrossCoach API", version="0.1.0")
 
@@ -20,13 +26,16 @@ app.add_middleware(
 @app.on_event("startup")
 def on_startup():
     Base.metadata.create_all(bind=engine)
-    # Start the background scheduler
-    scheduler.start()
-
-@app.on_event("shutdown")
-def on_shutdown():
-    # Shutdown the background scheduler
-    scheduler.shutdown()
+    # Bring databases created by older versions up to date: covering log index,
+    # journal summary content hashes and correlation pair keys
+    db = SessionLocal()
+    try:
+        migrate_log_entry_indexes(db)
+        migrate_journal_summary_content_hash(db)
+        migrate_correlation_insight_pair_key(db)
+    finally:
+        db.close()
+    # The weekly analytics job runs in the separate scheduler service (app.core.scheduler)
 
 @app.get("/health")
 def health():
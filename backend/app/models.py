@@ -43,9 +43,10 @@ class LogEntry(Base):
     # Relationships
     user: Mapped[User] = relationship(back_populates="log_entries")
 
-    # Indexes for performance
+    # Indexes for performance; INCLUDE (value) lets (user_id, date) scans of
+    # domain/metric/value run as index-only scans
     __table_args__ = (
-        Index('idx_log_entries_user_date', 'user_id', 'date'),
+        Index('idx_log_entries_user_date_metric', 'user_id', 'date', 'domain', 'metric', postgresql_include=['value']),
     )
 
 class CorrelationInsight(Base):
@@ -55,11 +56,17 @@ class CorrelationInsight(Base):
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     correlation_score: Mapped[float] = mapped_column(Float, nullable=False)
+    # Canonical "a~b" key (a < b) of the metric pair, used to upsert one row per pair
+    metric_pair_key: Mapped[str | None] = mapped_column(String(511), nullable=True)
     created_at: Mapped[str] = mapped_column(server_default=func.now())
 
     # Relationships
     user: Mapped[User] = relationship(back_populates="correlation_insights")
 
+    __table_args__ = (
+        Index('uq_correlation_insights_user_pair', 'user_id', 'metric_pair_key', unique=True),
+    )
+
 class JournalSummary(Base):
     __tablename__ = "journal_summaries"
     
@@ -67,6 +74,8 @@ class JournalSummary(Base):
     user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     date: Mapped[Date] = mapped_column(Date, nullable=False)
     summary_text: Mapped[str] = mapped_column(Text, nullable=False)
+    # BLAKE2b-128 hex digest of the summarized text, so repeat entries reuse their summary
+    content_hash: Mapped[str | None] = mapped_column(String(32), nullable=True)
 
     # Relationships
     user: Mapped[User] = relationship(back_populates="journal_summaries")
@@ -74,4 +83,5 @@ class JournalSummary(Base):
     # Indexes for performance
     __table_args__ = (
         Index('idx_journal_summaries_user_date', 'user_id', 'date'),
+        Index('uq_journal_summaries_user_hash_date', 'user_id', 'content_hash', 'date', unique=True),
     ) 
\ No newline at end of file
@@ -9,8 +9,12 @@ about significant correlations.
 
 import sys
 import os
+import glob
+import hashlib
+import io
+import tempfile
 import uuid
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from datetime import datetime, timedelta
 
 # Add the parent directory to the path so we can import from app
@@ -20,11 +24,107 @@ import pandas as pd
 import numpy as np
 from scipy import stats
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, or_, select, delete, distinct, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.db import SessionLocal
 from app.models import User, LogEntry, CorrelationInsight, DomainEnum
 
+try:
+    import numba
+except ImportError:  # numba is optional; every width then uses the BLAS path
+    numba = None
+
+# Pivots are cached per user, keyed by count, latest date and value sum of their logs
+PIVOT_CACHE_DIR = os.environ.get('CORRELATION_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'corr_cache'))
+
+# One record per metric pair (column indices, r, p-value, sample count); result dicts
+# are only built for the top correlations that survive selection
+CORRELATION_DTYPE = np.dtype([('i', 'i4'), ('j', 'i4'), ('r', 'f8'), ('p', 'f8'), ('n', 'i4')])
+
+# Fewest rows that can hold two metrics sharing 3 dates
+MIN_ROWS = 6
+
+# Above this many metrics^2 x dates cells, the numba pair loop replaces the moment matrices
+BLAS_PAIRWISE_BUDGET = 50_000_000
+
+
+def fetch_log_stats(db: Session, user_id: uuid.UUID) -> Tuple[int, int, Any, Any]:
+    """
+    Summarise a user's logs in one aggregate query.
+    
+    Args:
+        db: Database session
+        user_id: UUID of the user
+        
+    Returns:
+        Tuple of (log entry count, distinct metric count, latest date, sum of values)
+    """
+    stmt = select(
+        func.count(),
+        func.count(distinct(tuple_(LogEntry.domain, LogEntry.metric))),
+        func.max(LogEntry.date),
+        func.sum(LogEntry.value)
+    ).where(LogEntry.user_id == user_id)
+    return tuple(db.execute(stmt).one())
+
+
+def _pivot_cache_path(user_id: uuid.UUID, fingerprint: Tuple) -> str:
+    """Cache file for a user's pivot; the name changes whenever the log fingerprint does."""
+    digest = hashlib.sha256(repr(fingerprint).encode()).hexdigest()[:16]
+    return os.path.join(PIVOT_CACHE_DIR, f"{user_id}-{digest}.npz")
+
+
+def load_cached_pivot(user_id: uuid.UUID, fingerprint: Tuple) -> Optional[pd.DataFrame]:
+    """
+    Load the pivoted DataFrame cached for this exact log fingerprint.
+    
+    Args:
+        user_id: UUID of the user
+        fingerprint: Log stats the pivot was built from
+        
+    Returns:
+        Pivoted DataFrame, or None on a cache miss
+    """
+    try:
+        with np.load(_pivot_cache_path(user_id, fingerprint)) as cached:
+            return pd.DataFrame(
+                cached['values'],
+                index=pd.Index(cached['dates'].astype(object), name='date'),
+                columns=pd.Index(cached['columns'].tolist(), name='domain_metric')
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_cached_pivot(user_id: uuid.UUID, fingerprint: Tuple, pivoted: pd.DataFrame) -> None:
+    """
+    Cache a pivoted DataFrame, replacing any older pivot for the user.
+    
+    Args:
+        user_id: UUID of the user
+        fingerprint: Log stats the pivot was built from
+        pivoted: Pivoted DataFrame with dates as index and metrics as columns
+    """
+    path = _pivot_cache_path(user_id, fingerprint)
+    try:
+        os.makedirs(PIVOT_CACHE_DIR, exist_ok=True)
+        for stale in glob.glob(os.path.join(PIVOT_CACHE_DIR, f"{user_id}-*.npz")):
+            os.remove(stale)
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                values=pivoted.to_numpy(dtype=np.float64),
+                dates=np.array(pivoted.index, dtype='datetime64[D]'),
+                columns=np.array(pivoted.columns, dtype=str)
+            )
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # The cache is only an optimisation; never fail the analysis over it
+        print(f"Could not cache pivot for user {user_id}: {e}")
+
 
 def fetch_user_logs(db: Session, user_id: uuid.UUID) -> pd.DataFrame:
     """
@@ -37,21 +137,33 @@ def fetch_user_logs(db: Session, user_id: uuid.UUID) -> pd.DataFrame:
     Returns:
         DataFrame with columns: date, domain, metric, value
     """
-    logs = db.query(LogEntry).filter(LogEntry.user_id == user_id).all()
+    # COPY the covered columns out as CSV and parse them with pandas' C reader, skipping
+    # per-row tuple building in the driver; domain is cast to text so no enums are built
+    cursor = db.connection().connection.cursor()
+    try:
+        query = cursor.mogrify(
+            "SELECT date, domain::text, metric, value FROM log_entries WHERE user_id = %s",
+            (str(user_id),)
+        ).decode()
+        buffer = io.StringIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
     
-    if not logs:
-        raise ValueError(f"No logs found for user {user_id}")
+    buffer.seek(0)
+    df = pd.read_csv(
+        buffer,
+        names=['date', 'domain', 'metric', 'value'],
+        dtype={'domain': 'category', 'metric': str, 'value': np.float64},
+        parse_dates=['date'],
+        # Every column is NOT NULL; keep metric names such as "NA" or "" as they are
+        na_filter=False
+    )
     
-    data = []
-    for log in logs:
-        data.append({
-            'date': log.date,
-            'domain': log.domain.value,
-            'metric': log.metric,
-            'value': log.value
-        })
+    if df.empty:
+        raise ValueError(f"No logs found for user {user_id}")
     
-    return pd.DataFrame(data)
+    return df
 
 
 def group_logs_by_domain_metric(df: pd.DataFrame) -> pd.DataFrame:
@@ -65,94 +177,194 @@ def group_logs_by_domain_metric(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         Pivoted DataFrame with dates as index and metrics as columns
     """
-    # Create a unique identifier for each domain-metric combination
-    df['domain_metric'] = df['domain'] + '_' + df['metric']
-    
-    # Pivot the data to get metrics as columns
-    pivoted = df.pivot_table(
-        index='date',
-        columns='domain_metric',
-        values='value',
-        aggfunc='mean'  # In case of multiple entries per day
+    # Integer codes for each domain-metric combination, combined from the two columns'
+    # codes so no per-row "domain_metric" string is built
+    domains = pd.Categorical(df['domain'])
+    metrics = pd.Categorical(df['metric'])
+    pair_codes = domains.codes.astype(np.int64) * len(metrics.categories) + metrics.codes
+    pair_ids, column_ids = np.unique(pair_codes, return_inverse=True)
+    
+    # Readable names only for the distinct combinations, ordered as the string keys sort
+    names = np.array([
+        f"{domains.categories[code // len(metrics.categories)]}_{metrics.categories[code % len(metrics.categories)]}"
+        for code in pair_ids
+    ])
+    order = np.argsort(names)
+    column_ids = np.argsort(order)[column_ids]
+    
+    # Dates as int32 days since the epoch, so row codes come from integer uniques, not date hashing
+    days = df['date'].to_numpy(dtype='datetime64[D]').view(np.int64).astype(np.int32)
+    day_ids, row_ids = np.unique(days, return_inverse=True)
+    
+    # Scatter values into a dense (dates x metrics) matrix, averaging multiple entries per day
+    sums = np.zeros((len(day_ids), len(pair_ids)))
+    counts = np.zeros_like(sums)
+    np.add.at(sums, (row_ids, column_ids), df['value'].to_numpy(dtype=np.float64))
+    np.add.at(counts, (row_ids, column_ids), 1)
+    means = sums / np.where(counts == 0, np.nan, counts)
+    
+    return pd.DataFrame(
+        means,
+        # Real dates only for the distinct days, for presentation
+        index=pd.Index(day_ids.astype('datetime64[D]').astype(object), name='date'),
+        columns=pd.Index(names[order].tolist(), name='domain_metric')
     )
+
+
+def _pair_corr_blas(values: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pairwise Pearson r and shared-date counts from masked moment matrix products.
+    
+    The products run in float32, which halves the bytes each GEMM moves. Each
+    column is first shifted by its own mean (in float64); r is shift invariant,
+    and centring keeps the float32 sum-of-squares differences well conditioned.
+    """
+    counts = mask.sum(axis=0)
+    means = np.where(mask, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    weights = mask.astype(np.float32)
+    values = np.where(mask, values - means, 0.0).astype(np.float32)
     
-    return pivoted
+    # Entry [i, j] sums metric i over the dates metric j was also logged
+    n = weights.T @ weights
+    sums = values.T @ weights
+    sumsq = (values * values).T @ weights
+    cross = values.T @ values
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = cross - sums * sums.T / n
+        var = sumsq - sums * sums / n
+        r = np.clip(cov / np.sqrt(var * var.T), -1.0, 1.0)
+    # Treat float32 cancellation-level variance as a constant series, which has no correlation
+    constant = var <= 1e-5 * sumsq
+    r[constant | constant.T] = np.nan
+    # Back to float64 for the t-distribution p-values
+    return r.astype(np.float64), n.astype(np.float64)
+
+
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def _pair_corr(values: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Pairwise Pearson r and shared-date counts, one pass over the rows per pair."""
+        n_rows, n_metrics = values.shape
+        out_r = np.full((n_metrics, n_metrics), np.nan)
+        out_n = np.zeros((n_metrics, n_metrics))
+        for i in numba.prange(n_metrics):
+            for j in range(i + 1, n_metrics):
+                n = 0.0
+                sx = 0.0
+                sy = 0.0
+                sxx = 0.0
+                syy = 0.0
+                sxy = 0.0
+                for k in range(n_rows):
+                    if mask[k, i] and mask[k, j]:
+                        x = values[k, i]
+                        y = values[k, j]
+                        n += 1.0
+                        sx += x
+                        sy += y
+                        sxx += x * x
+                        syy += y * y
+                        sxy += x * y
+                out_n[i, j] = n
+                if n == 0.0:
+                    continue
+                var_x = sxx - sx * sx / n
+                var_y = syy - sy * sy / n
+                if var_x <= 1e-12 * sxx or var_y <= 1e-12 * syy:
+                    continue
+                r = (sxy - sx * sy / n) / np.sqrt(var_x * var_y)
+                out_r[i, j] = min(1.0, max(-1.0, r))
+        return out_r, out_n
 
 
-def calculate_correlations(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def calculate_correlations(df: pd.DataFrame) -> np.ndarray:
     """
     Calculate pairwise correlations between all metrics.
     
+    Every pair is compared over the dates both metrics were logged. The
+    pairwise counts, sums and cross products come from a handful of matrix
+    products over the NaN-masked values, or from a numba kernel when those
+    matrices would be too large, and p-values from the t-statistic
+    ``r * sqrt((n - 2) / (1 - r**2))``, so no per-pair Python work is done.
+    
     Args:
         df: Pivoted DataFrame with metrics as columns
         
     Returns:
-        List of correlation results with p-values
+        Structured array with one CORRELATION_DTYPE record per testable pair:
+        column indices ``i`` < ``j``, correlation ``r``, ``p`` value and
+        sample count ``n``
     """
-    correlations = []
     metrics = df.columns.tolist()
+    # Pivoted frames can hand back a Fortran-ordered view; fix the layout once up front
+    values = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+    mask = ~np.isnan(values)
     
-    for i, metric1 in enumerate(metrics):
-        for j, metric2 in enumerate(metrics):
-            if i >= j:  # Skip duplicate pairs and self-correlations
-                continue
-                
-            # Get the two series, removing NaN values
-            series1 = df[metric1].dropna()
-            series2 = df[metric2].dropna()
-            
-            # Find common dates
-            common_dates = series1.index.intersection(series2.index)
-            
-            if len(common_dates) < 3:  # Need at least 3 data points
-                continue
-                
-            # Get values for common dates
-            values1 = series1.loc[common_dates]
-            values2 = series2.loc[common_dates]
-            
-            # Calculate correlation
-            correlation, p_value = stats.pearsonr(values1, values2)
-            
-            # Skip if correlation is NaN
-            if np.isnan(correlation):
-                continue
-                
-            correlations.append({
-                'metric1': metric1,
-                'metric2': metric2,
-                'correlation': correlation,
-                'p_value': p_value,
-                'n_samples': len(common_dates)
-            })
+    if numba is not None and len(metrics) ** 2 * len(values) > BLAS_PAIRWISE_BUDGET:
+        r, n = _pair_corr(values, mask)
+    else:
+        r, n = _pair_corr_blas(values, mask)
+    
+    # Upper triangle only: skip duplicate pairs and self-correlations
+    rows, cols = np.triu_indices(len(metrics), k=1)
+    n_pairs = n[rows, cols]
+    r_pairs = r[rows, cols]
+    keep = (n_pairs >= 3) & ~np.isnan(r_pairs)  # Need at least 3 data points
+    rows, cols, n_pairs, r_pairs = rows[keep], cols[keep], n_pairs[keep], r_pairs[keep]
     
-    return correlations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t_stat = r_pairs * np.sqrt((n_pairs - 2) / (1.0 - r_pairs ** 2))
+    p_values = 2 * stats.t.sf(np.abs(t_stat), n_pairs - 2)
+    
+    pairs = np.empty(len(rows), dtype=CORRELATION_DTYPE)
+    pairs['i'], pairs['j'] = rows, cols
+    pairs['r'], pairs['p'], pairs['n'] = r_pairs, p_values, n_pairs
+    return pairs
 
 
-def select_top_correlations(correlations: List[Dict[str, Any]], 
+def select_top_correlations(correlations: np.ndarray, metrics: List[str],
                           top_n: int = 3) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
     """
     Select top positive and negative correlations with p < 0.05.
     
     Args:
-        correlations: List of correlation results
+        correlations: Structured array of correlation results from calculate_correlations
+        metrics: Metric names the ``i``/``j`` column indices refer to
         top_n: Number of top correlations to select
         
     Returns:
-        Tuple of (positive_correlations, negative_correlations)
+        Tuple of (positive_correlations, negative_correlations) as result dicts
     """
-    # Filter for significant correlations (p < 0.05)
-    significant = [c for c in correlations if c['p_value'] < 0.05]
-    
-    # Separate positive and negative correlations
-    positive = [c for c in significant if c['correlation'] > 0]
-    negative = [c for c in significant if c['correlation'] < 0]
+    # Filter for significant correlations (p < 0.05), separated into positive and negative
+    significant = correlations[correlations['p'] < 0.05]
+    positive = significant[significant['r'] > 0]
+    negative = significant[significant['r'] < 0]
     
-    # Sort by absolute correlation value and take top N
-    positive.sort(key=lambda x: abs(x['correlation']), reverse=True)
-    negative.sort(key=lambda x: abs(x['correlation']), reverse=True)
-    
-    return positive[:top_n], negative[:top_n]
+    return _top_by_strength(positive, metrics, top_n), _top_by_strength(negative, metrics, top_n)
+
+
+def _top_by_strength(candidates: np.ndarray, metrics: List[str], top_n: int) -> List[Dict[str, Any]]:
+    """Strongest ``top_n`` candidates by |r| as result dicts, strongest first, found without a full sort."""
+    strength = np.abs(candidates['r'])
+    if len(candidates) > top_n:
+        # O(M) partition finds the cut-off strength; ties at the cut keep their original order
+        cutoff = np.partition(strength, len(strength) - top_n)[len(strength) - top_n]
+        stronger = np.flatnonzero(strength > cutoff)
+        ties = np.flatnonzero(strength == cutoff)[:top_n - len(stronger)]
+        keep = np.sort(np.concatenate([stronger, ties]))
+        candidates, strength = candidates[keep], strength[keep]
+    # Dicts are only built for the few survivors
+    return [
+        {
+            'metric1': metrics[pair['i']],
+            'metric2': metrics[pair['j']],
+            'correlation': float(pair['r']),
+            'p_value': float(pair['p']),
+            'n_samples': int(pair['n'])
+        }
+        for pair in candidates[np.argsort(-strength, kind='stable')]
+    ]
 
 
 def generate_insight_text(correlation: Dict[str, Any]) -> str:
@@ -206,30 +418,45 @@ def save_insights_to_db(db: Session, user_id: uuid.UUID,
     Args:
         db: Database session
         user_id: UUID of the user
-        positive_correlations: List of positive correlation results
-        negative_correlations: List of negative correlation results
+        positive_correlations: List of positive correlation results, with 'insight' text
+        negative_correlations: List of negative correlation results, with 'insight' text
     """
-    # Clear existing insights for this user
-    db.query(CorrelationInsight).filter(CorrelationInsight.user_id == user_id).delete()
-    
-    # Create insights for positive correlations
-    for corr in positive_correlations:
-        insight = CorrelationInsight(
-            user_id=user_id,
-            description=generate_insight_text(corr),
-            correlation_score=corr['correlation']
-        )
-        db.add(insight)
-    
-    # Create insights for negative correlations
-    for corr in negative_correlations:
-        insight = CorrelationInsight(
-            user_id=user_id,
-            description=generate_insight_text(corr),
-            correlation_score=corr['correlation']
-        )
-        db.add(insight)
+    rows = [
+        {
+            # Explicit ids: a multi-row VALUES insert only fills the Python-side default once
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'description': corr['insight'],
+            'correlation_score': corr['correlation'],
+            'metric_pair_key': '~'.join(sorted((corr['metric1'], corr['metric2'])))
+        }
+        for corr in positive_correlations + negative_correlations
+    ]
     
+    # Insights for pairs outside the new top correlations, or with no pair key, are stale
+    stale = delete(CorrelationInsight).where(CorrelationInsight.user_id == user_id)
+    if not rows:
+        db.execute(stale)
+        db.commit()
+        return
+    stale = stale.where(or_(
+        CorrelationInsight.metric_pair_key.is_(None),
+        CorrelationInsight.metric_pair_key.not_in([row['metric_pair_key'] for row in rows])
+    ))
+    
+    # One statement: the stale rows are deleted in a CTE while current pairs are upserted in place
+    stmt = pg_insert(CorrelationInsight).values(rows).add_cte(
+        stale.returning(CorrelationInsight.id).cte('stale_insights')
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'metric_pair_key'],
+        set_={
+            'description': stmt.excluded.description,
+            'correlation_score': stmt.excluded.correlation_score,
+            'created_at': func.now()
+        }
+    )
+    db.execute(stmt)
     db.commit()
 
 
@@ -246,24 +473,45 @@ def run_correlation_analysis(user_id: uuid.UUID) -> Dict[str, Any]:
     db = SessionLocal()
     
     try:
-        # Fetch user logs
-        print(f"Fetching logs for user {user_id}...")
-        logs_df = fetch_user_logs(db, user_id)
-        print(f"Found {len(logs_df)} log entries")
-        
-        # Group by domain + metric
-        print("Grouping logs by domain and metric...")
-        pivoted_df = group_logs_by_domain_metric(logs_df)
-        print(f"Created {len(pivoted_df.columns)} metric columns")
+        # Check the data volume in SQL before pulling any rows into pandas
+        fingerprint = fetch_log_stats(db, user_id)
+        total_logs, total_metrics = fingerprint[0], fingerprint[1]
+        if total_logs == 0:
+            raise ValueError(f"No logs found for user {user_id}")
         
-        # Calculate correlations
-        print("Calculating pairwise correlations...")
-        correlations = calculate_correlations(pivoted_df)
-        print(f"Found {len(correlations)} correlation pairs")
+        if total_logs < MIN_ROWS or total_metrics < 2:
+            print(f"Found {total_logs} log entries across {total_metrics} metrics, too few to correlate")
+            correlations, metric_names = np.empty(0, dtype=CORRELATION_DTYPE), []
+        else:
+            # Reuse the pivot from the last run if the logs have not changed since
+            pivoted_df = load_cached_pivot(user_id, fingerprint)
+            if pivoted_df is not None:
+                print(f"Using cached pivot for {total_logs} log entries")
+            else:
+                # Fetch user logs
+                print(f"Fetching logs for user {user_id}...")
+                logs_df = fetch_user_logs(db, user_id)
+                print(f"Found {len(logs_df)} log entries")
+                
+                # Group by domain + metric
+                print("Grouping logs by domain and metric...")
+                pivoted_df = group_logs_by_domain_metric(logs_df)
+                save_cached_pivot(user_id, fingerprint, pivoted_df)
+            print(f"Created {len(pivoted_df.columns)} metric columns")
+            
+            # Calculate correlations
+            print("Calculating pairwise correlations...")
+            correlations = calculate_correlations(pivoted_df)
+            metric_names = pivoted_df.columns.tolist()
+            print(f"Found {len(correlations)} correlation pairs")
         
         # Select top correlations
         print("Selecting top correlations...")
-        positive_corr, negative_corr = select_top_correlations(correlations)
+        positive_corr, negative_corr = select_top_correlations(correlations, metric_names)
+        
+        # Generate each insight's text once; saving and the results both reuse it
+        for c in positive_corr + negative_corr:
+            c['insight'] = generate_insight_text(c)
         
         # Save insights to database
         print("Saving insights to database...")
@@ -272,8 +520,8 @@ def run_correlation_analysis(user_id: uuid.UUID) -> Dict[str, Any]:
         # Prepare results
         results = {
             'user_id': str(user_id),
-            'total_logs': len(logs_df),
-            'total_metrics': len(pivoted_df.columns),
+            'total_logs': total_logs,
+            'total_metrics': total_metrics,
             'total_correlations': len(correlations),
             'significant_correlations': len(positive_corr) + len(negative_corr),
             'positive_correlations': [
@@ -281,7 +529,7 @@ def run_correlation_analysis(user_id: uuid.UUID) -> Dict[str, Any]:
                     'metrics': f"{c['metric1']} vs {c['metric2']}",
                     'correlation': c['correlation'],
                     'p_value': c['p_value'],
-                    'insight': generate_insight_text(c)
+                    'insight': c['insight']
                 }
                 for c in positive_corr
             ],
@@ -290,7 +538,7 @@ def run_correlation_analysis(user_id: uuid.UUID) -> Dict[str, Any]:
                     'metrics': f"{c['metric1']} vs {c['metric2']}",
                     'correlation': c['correlation'],
                     'p_value': c['p_value'],
-                    'insight': generate_insight_text(c)
+                    'insight': c['insight']
                 }
                 for c in negative_corr
             ]
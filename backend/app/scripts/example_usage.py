@@ -16,6 +16,8 @@ import requests
 import json
 from datetime import date, timedelta
 
+from sqlalchemy import insert
+
 # Add the parent directory to the path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -69,19 +71,19 @@ def create_sample_user_data():
             # Learning hours (more on weekdays)
             learning_hours = 2.0 + (day_of_week < 5) * 1.5 + (i % 4 - 1) * 0.5
             
-            # Create log entries
-            entries = [
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.sleep, metric="hours", value=sleep_hours),
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.climbing, metric="performance", value=climbing_performance),
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.reflection, metric="stress_level", value=stress_level),
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.fitness, metric="exercise_frequency", value=exercise_frequency),
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.reflection, metric="mood", value=mood),
-                LogEntry(user_id=user_id, date=current_date, domain=DomainEnum.learning, metric="hours", value=learning_hours),
-            ]
-            
-            log_entries.extend(entries)
-        
-        db.add_all(log_entries)
+            # Create log entries as plain rows for a bulk insert
+            for domain, metric, value in (
+                (DomainEnum.sleep, "hours", sleep_hours),
+                (DomainEnum.climbing, "performance", climbing_performance),
+                (DomainEnum.reflection, "stress_level", stress_level),
+                (DomainEnum.fitness, "exercise_frequency", exercise_frequency),
+                (DomainEnum.reflection, "mood", mood),
+                (DomainEnum.learning, "hours", learning_hours),
+            ):
+                log_entries.append({"user_id": user_id, "date": current_date, "domain": domain, "metric": metric, "value": value})
+        
+        # One executemany; the engine's values_plus_batch mode sends it as multi-row VALUES
+        db.execute(insert(LogEntry), log_entries)
         db.commit()
         
         print(f"Created user {user_id} with {len(log_entries)} log entries")
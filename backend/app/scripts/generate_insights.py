@@ -62,20 +62,22 @@ def generate_example_insights():
             }
         ]
         
-        # Insert insights
-        for insight in insights:
-            db.execute(
-                text("""
-                    INSERT INTO insights (user_id, week_start, summary, correlations)
-                    VALUES (:user_id, :week_start, :summary, :correlations)
-                """),
+        # Insert all insights with one executemany of the same bound statement
+        db.execute(
+            text("""
+                INSERT INTO insights (user_id, week_start, summary, correlations)
+                VALUES (:user_id, :week_start, :summary, :correlations)
+            """),
+            [
                 {
                     "user_id": user_id,
                     "week_start": insight["week_start"],
                     "summary": insight["summary"],
                     "correlations": json.dumps(insight["correlations"])
                 }
-            )
+                for insight in insights
+            ]
+        )
         
         db.commit()
         print("Generated example insights:")
@@ -2,14 +2,21 @@ from datetime import date, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import select, text
 from ..db import SessionLocal
-import hashlib
-import random
+from ..core.auth import get_password_hash
+import numpy as np
 import json
 
+# Built once and reused, so SQLAlchemy's compiled cache serves every seed run;
+# measurement rows leave note NULL and the journaling row leaves value NULL
+INSERT_LOG = text(
+    "INSERT INTO logs (user_id, log_date, domain, value, note) "
+    "VALUES (:user_id, :log_date, :domain, :value, :note)"
+)
+
 
 def hash_password(password: str) -> str:
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password with bcrypt, the scheme the API verifies logins against"""
+    return get_password_hash(password)
 
 
 def ensure_user(db: Session, email: str, name: str, password: str):
@@ -24,12 +31,15 @@ def ensure_user(db: Session, email: str, name: str, password: str):
     
     # Create user with hashed password
     # First, add password_hash column if it doesn't exist
-    try:
+    has_password_hash = db.execute(
+        text("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'password_hash'
+        """)
+    ).first()
+    if not has_password_hash:
         db.execute(text("ALTER TABLE users ADD COLUMN password_hash TEXT"))
         db.commit()
-    except Exception:
-        # Column already exists
-        pass
     
     result = db.execute(
         text("INSERT INTO users (email, name, password_hash) VALUES (:email, :name, :password_hash) RETURNING id"),
@@ -45,102 +55,73 @@ def ensure_user(db: Session, email: str, name: str, password: str):
     return user_id
 
 
-def seed_logs(db: Session, user_id):
+def seed_logs(db: Session, user_id, rng: np.random.Generator = None):
     """Seed 2 weeks of realistic data with correlations"""
     end = date.today()
     start = end - timedelta(days=13)  # 2 weeks
-    curr = start
-    
-    # Track sleep hours to create correlations
-    sleep_data = {}
-    
-    while curr <= end:
-        # Sleep: hours (4-9) - create some days with 7+ hours
-        sleep_hours = random.uniform(4, 9)
-        if random.random() < 0.4:  # 40% chance of 7+ hours
-            sleep_hours = random.uniform(7, 9)
-        sleep_data[curr] = sleep_hours
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, value) VALUES (:user_id, :log_date, 'sleep', :value)"),
-            {
-                "user_id": user_id,
-                "log_date": curr,
-                "value": round(sleep_hours, 1)
-            }
-        )
-        
-        # Climbing: grade normalized (0-10) - better after good sleep
-        base_climbing = random.uniform(3, 8)
-        if sleep_data[curr] >= 7:
-            base_climbing += random.uniform(1, 2)  # 25% better after 7+ hours sleep
-        climbing_grade = min(10, round(base_climbing, 1))
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, value) VALUES (:user_id, :log_date, 'climbing', :value)"),
-            {
-                "user_id": user_id,
-                "log_date": curr,
-                "value": climbing_grade
-            }
-        )
-        
-        # Fitness: minutes trained (0-90)
-        fitness_minutes = random.uniform(0, 90)
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, value) VALUES (:user_id, :log_date, 'fitness', :value)"),
-            {
-                "user_id": user_id,
-                "log_date": curr,
-                "value": round(fitness_minutes, 1)
-            }
-        )
-        
-        # Coding: hours focused (0-8) - some days with >3h
-        coding_hours = random.uniform(0, 8)
-        if random.random() < 0.3:  # 30% chance of >3h coding
-            coding_hours = random.uniform(3, 8)
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, value) VALUES (:user_id, :log_date, 'coding', :value)"),
-            {
-                "user_id": user_id,
-                "log_date": curr,
-                "value": round(coding_hours, 1)
-            }
-        )
-        
-        # Mood: 1-5 - dips on days with >3h coding but no exercise
-        base_mood = random.uniform(3, 5)
-        if coding_hours > 3 and fitness_minutes < 30:
-            base_mood -= random.uniform(1, 2)  # Mood dip
-        mood_rating = max(1, min(5, round(base_mood, 1)))
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, value) VALUES (:user_id, :log_date, 'mood', :value)"),
-            {
-                "user_id": user_id,
-                "log_date": curr,
-                "value": mood_rating
-            }
-        )
-        
-        # Journaling: note only
-        note = f"Day {curr.isoformat()}: Sleep {sleep_data[curr]:.1f}h, Climbing {climbing_grade}, Coding {coding_hours:.1f}h, Mood {mood_rating:.1f}. "
-        if sleep_data[curr] >= 7:
-            note += "Feeling well-rested today. "
-        if coding_hours > 3 and fitness_minutes < 30:
-            note += "Long coding session without exercise - feeling a bit drained. "
-        if fitness_minutes > 60:
-            note += "Great workout session! "
-        
-        db.execute(
-            text("INSERT INTO logs (user_id, log_date, domain, note) VALUES (:user_id, :log_date, 'journaling', :note)"),
-            {
+    dates = [start + timedelta(days=i) for i in range(14)]
+    n = len(dates)
+    if rng is None:
+        rng = np.random.default_rng()
+    
+    # Draw every day's values up front, one vectorised call per domain
+    # Sleep: hours (4-9) - create some days with 7+ hours
+    sleep = rng.uniform(4, 9, n)
+    rested = rng.random(n) < 0.4  # 40% chance of 7+ hours
+    sleep[rested] = rng.uniform(7, 9, rested.sum())
+    
+    # Climbing: grade normalized (0-10) - better after good sleep
+    climbing = rng.uniform(3, 8, n)
+    climbing += np.where(sleep >= 7, rng.uniform(1, 2, n), 0)  # 25% better after 7+ hours sleep
+    climbing = np.minimum(10, climbing.round(1))
+    
+    # Fitness: minutes trained (0-90)
+    fitness = rng.uniform(0, 90, n)
+    
+    # Coding: hours focused (0-8) - some days with >3h
+    coding = rng.uniform(0, 8, n)
+    long_coding = rng.random(n) < 0.3  # 30% chance of >3h coding
+    coding[long_coding] = rng.uniform(3, 8, long_coding.sum())
+    
+    # Mood: 1-5 - dips on days with >3h coding but no exercise
+    mood = rng.uniform(3, 5, n)
+    mood -= np.where((coding > 3) & (fitness < 30), rng.uniform(1, 2, n), 0)  # Mood dip
+    mood = np.clip(mood.round(1), 1, 5)
+    
+    days = list(zip(dates, sleep.tolist(), climbing.tolist(), fitness.tolist(), coding.tolist(), mood.tolist()))
+    
+    # Journaling: note only, built from its parts in one join per day
+    notes = [
+        "".join((
+            f"Day {curr.isoformat()}: Sleep {sleep_hours:.1f}h, Climbing {climbing_grade}, Coding {coding_hours:.1f}h, Mood {mood_rating:.1f}. ",
+            "Feeling well-rested today. " if sleep_hours >= 7 else "",
+            "Long coding session without exercise - feeling a bit drained. " if coding_hours > 3 and fitness_minutes < 30 else "",
+            "Great workout session! " if fitness_minutes > 60 else "",
+        ))
+        for curr, sleep_hours, climbing_grade, fitness_minutes, coding_hours, mood_rating in days
+    ]
+    
+    # Collect every day's rows and send them in one executemany round trip
+    rows = []
+    
+    for (curr, sleep_hours, climbing_grade, fitness_minutes, coding_hours, mood_rating), note in zip(days, notes):
+        for domain, value, day_note in (
+            ("sleep", round(sleep_hours, 1), None),
+            ("climbing", climbing_grade, None),
+            ("fitness", round(fitness_minutes, 1), None),
+            ("coding", round(coding_hours, 1), None),
+            ("mood", mood_rating, None),
+            ("journaling", None, note),
+        ):
+            rows.append({
                 "user_id": user_id,
                 "log_date": curr,
-                "note": note
-            }
-        )
-        
-        curr += timedelta(days=1)
+                "domain": domain,
+                "value": value,
+                "note": day_note
+            })
     
+    db.execute(INSERT_LOG, rows)
     db.commit()
 
 
@@ -190,20 +171,23 @@ def generate_example_insights(db: Session, user_id):
         }
     ]
     
-    # Insert insights
-    for insight in insights:
-        db.execute(
-            text("""
-                INSERT INTO insights (user_id, week_start, summary, correlations)
-                VALUES (:user_id, :week_start, :summary, :correlations)
-            """),
-            {
-                "user_id": user_id,
-                "week_start": insight["week_start"],
-                "summary": insight["summary"],
-                "correlations": json.dumps(insight["correlations"])
-            }
-        )
+    # Insert insights in one executemany round trip
+    rows = [
+        {
+            "user_id": user_id,
+            "week_start": insight["week_start"],
+            "summary": insight["summary"],
+            "correlations": json.dumps(insight["correlations"])
+        }
+        for insight in insights
+    ]
+    db.execute(
+        text("""
+            INSERT INTO insights (user_id, week_start, summary, correlations)
+            VALUES (:user_id, :week_start, :summary, :correlations)
+        """),
+        rows
+    )
     
     db.commit()
 
@@ -219,8 +203,8 @@ def main():
         db.commit()
         print("Cleared existing logs for user")
         
-        # Seed new logs
-        seed_logs(db, user_id)
+        # Seed new logs (PCG64 generator; pass a seed here for reproducible data)
+        seed_logs(db, user_id, np.random.default_rng())
         print("Seeded 2 weeks of sample data with correlations")
         
         # Generate example insights
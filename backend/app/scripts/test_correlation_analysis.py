@@ -10,6 +10,7 @@ import sys
 import os
 import uuid
 from datetime import date, timedelta
+from sqlalchemy import insert
 
 # Add the parent directory to the path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -66,48 +67,18 @@ def create_test_data(db, user_id):
         # Mood (correlated with exercise)
         mood = 7.0 + exercise_frequency * 0.5 + (i % 6 - 2) * 0.3
         
-        # Create log entries
-        entries = [
-            LogEntry(
-                user_id=user_id,
-                date=current_date,
-                domain=DomainEnum.sleep,
-                metric="hours",
-                value=sleep_hours
-            ),
-            LogEntry(
-                user_id=user_id,
-                date=current_date,
-                domain=DomainEnum.climbing,
-                metric="performance",
-                value=climbing_performance
-            ),
-            LogEntry(
-                user_id=user_id,
-                date=current_date,
-                domain=DomainEnum.reflection,
-                metric="stress_level",
-                value=stress_level
-            ),
-            LogEntry(
-                user_id=user_id,
-                date=current_date,
-                domain=DomainEnum.fitness,
-                metric="exercise_frequency",
-                value=exercise_frequency
-            ),
-            LogEntry(
-                user_id=user_id,
-                date=current_date,
-                domain=DomainEnum.reflection,
-                metric="mood",
-                value=mood
-            )
-        ]
-        
-        log_entries.extend(entries)
+        # Create log entries as plain rows for a bulk insert
+        for domain, metric, value in (
+            (DomainEnum.sleep, "hours", sleep_hours),
+            (DomainEnum.climbing, "performance", climbing_performance),
+            (DomainEnum.reflection, "stress_level", stress_level),
+            (DomainEnum.fitness, "exercise_frequency", exercise_frequency),
+            (DomainEnum.reflection, "mood", mood),
+        ):
+            log_entries.append({"user_id": user_id, "date": current_date, "domain": domain, "metric": metric, "value": value})
     
-    db.add_all(log_entries)
+    # One executemany instead of 150 unit-of-work inserts
+    db.execute(insert(LogEntry), log_entries)
     db.commit()
     
     print(f"Created {len(log_entries)} test log entries for user {user_id}")
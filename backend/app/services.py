@@ -1,118 +1,233 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Row, select, insert, text
+from starlette.concurrency import run_in_threadpool
 from .models import User, LogEntry, CorrelationInsight, JournalSummary, DomainEnum
 from .schemas import UserRegister, LogEntryCreate, JournalEntryCreate
 from .core.auth import get_password_hash, verify_password
-from .core.config import settings
+from .core.config import get_settings
 from datetime import date
+from functools import lru_cache
+from hashlib import blake2b
+from typing import TYPE_CHECKING, AsyncIterator
+import asyncio
 import uuid
-import openai
 
+if TYPE_CHECKING:
+    import openai
 
-def create_user(db: Session, payload: UserRegister) -> User:
+settings = get_settings()
+
+
+# Built once; the engine's compiled cache then reuses its SQL on every log write
+_INSERT_LOG_ENTRY = insert(LogEntry).returning(LogEntry)
+
+
+@lru_cache(maxsize=1)
+def _openai_client() -> "openai.OpenAI":
+    """Shared OpenAI client so its connection pool survives across calls."""
+    # Imported on first use so endpoints that never call OpenAI skip its import cost
+    import openai
+    return openai.OpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_api_base
+    )
+
+
+@lru_cache(maxsize=1)
+def _async_openai_client() -> "openai.AsyncOpenAI":
+    """Shared async OpenAI client for the request handlers."""
+    import openai
+    return openai.AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_api_base
+    )
+
+
+def warm_openai_clients() -> None:
+    """Build the shared sync and async OpenAI clients ahead of the first call."""
+    if settings.openai_api_key:
+        _openai_client()
+        _async_openai_client()
+
+
+async def create_user(db: AsyncSession, payload: UserRegister) -> User:
     """Create a new user with hashed password."""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == payload.email).first()
+    existing_user = await get_user_by_email(db, payload.email)
     if existing_user:
         raise ValueError("User with this email already exists")
     
-    hashed_password = get_password_hash(payload.password)
-    user = User(
+    # bcrypt is CPU-bound; keep it off the event loop
+    hashed_password = await run_in_threadpool(get_password_hash, payload.password)
+    # RETURNING hands back the server defaults, so no refresh SELECT is needed
+    stmt = insert(User).values(
         email=payload.email,
         name=payload.name,
         password_hash=hashed_password
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    ).returning(User)
+    user = (await db.execute(stmt)).scalar_one()
+    await db.commit()
     return user
 
 
-def authenticate_user(db: Session, email: str, password: str) -> User | None:
-    """Authenticate a user with email and password."""
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        return None
-    if not verify_password(password, user.password_hash):
+# Hash checked against for unknown emails so misses cost the same as hits; computed
+# at import so the first unknown-email login doesn't run bcrypt on the event loop
+_DUMMY_PASSWORD_HASH = get_password_hash(uuid.uuid4().hex)
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> uuid.UUID | None:
+    """Authenticate a user with email and password, returning their id."""
+    # Login only needs the id, so fetch it and the hash as plain columns
+    stmt = select(User.id, User.password_hash).where(User.email == email)
+    row = (await db.execute(stmt)).first()
+    stored_hash = row.password_hash if row else _DUMMY_PASSWORD_HASH
+    # Always run bcrypt so response time does not reveal whether the email exists
+    password_ok = await run_in_threadpool(verify_password, password, stored_hash)
+    if not row or not password_ok:
         return None
-    return user
+    return row.id
 
 
-def get_user(db: Session, user_id: str) -> User | None:
+async def get_user(db: AsyncSession, user_id: str) -> User | None:
     """Get user by ID."""
     stmt = select(User).where(User.id == user_id)
-    return db.execute(stmt).scalar_one_or_none()
+    return (await db.execute(stmt)).scalar_one_or_none()
 
 
-def get_user_by_email(db: Session, email: str) -> User | None:
+async def get_user_by_email(db: AsyncSession, email: str) -> User | None:
     """Get user by email."""
-    return db.query(User).filter(User.email == email).first()
+    stmt = select(User).where(User.email == email)
+    return (await db.execute(stmt)).scalars().first()
 
 
-def create_log_entry(db: Session, user_id: str, payload: LogEntryCreate) -> LogEntry:
+async def create_log_entry(db: AsyncSession, user_id: str, payload: LogEntryCreate) -> LogEntry:
     """Create a new log entry."""
-    log_entry = LogEntry(
-        user_id=user_id,
-        date=payload.date,
-        domain=payload.domain,
-        metric=payload.metric,
-        value=payload.value,
-        notes=payload.notes
-    )
-    db.add(log_entry)
-    db.commit()
-    db.refresh(log_entry)
+    log_entry = (await db.execute(_INSERT_LOG_ENTRY, {
+        "user_id": user_id,
+        "date": payload.date,
+        "domain": payload.domain,
+        "metric": payload.metric,
+        "value": payload.value,
+        "notes": payload.notes
+    })).scalar_one()
+    await db.commit()
     return log_entry
 
 
-def create_journal_entry(db: Session, user_id: str, payload: JournalEntryCreate) -> LogEntry:
+async def create_journal_entry(db: AsyncSession, user_id: str, payload: JournalEntryCreate) -> LogEntry:
     """Create a journal entry (stored as LogEntry with domain=reflection)."""
     # Use mood_score as value if provided, otherwise use 0
     value = payload.mood_score if payload.mood_score is not None else 0.0
     
-    journal_entry = LogEntry(
-        user_id=user_id,
-        date=payload.date,
-        domain=DomainEnum.reflection,
-        metric="journal_entry",
-        value=value,
-        notes=payload.content
-    )
-    db.add(journal_entry)
-    db.commit()
-    db.refresh(journal_entry)
+    journal_entry = (await db.execute(_INSERT_LOG_ENTRY, {
+        "user_id": user_id,
+        "date": payload.date,
+        "domain": DomainEnum.reflection,
+        "metric": "journal_entry",
+        "value": value,
+        "notes": payload.content
+    })).scalar_one()
+    await db.commit()
     return journal_entry
 
 
-def get_logs_for_user(db: Session, user_id: str) -> list[LogEntry]:
+def migrate_log_entry_indexes(db: Session) -> None:
+    """Swap the old (user_id, date) index for the covering one on databases created before it."""
+    # create_all skips indexes on tables that already exist
+    for index in LogEntry.__table__.indexes:
+        index.create(db.connection(), checkfirst=True)
+    db.execute(text("DROP INDEX IF EXISTS idx_log_entries_user_date"))
+    db.commit()
+
+
+def migrate_journal_summary_content_hash(db: Session) -> None:
+    """Add the content_hash column and its unique index on databases created before them."""
+    # create_all skips new columns and indexes on tables that already exist
+    db.execute(text("ALTER TABLE journal_summaries ADD COLUMN IF NOT EXISTS content_hash VARCHAR(32)"))
+    for index in JournalSummary.__table__.indexes:
+        index.create(db.connection(), checkfirst=True)
+    db.commit()
+
+
+def migrate_correlation_insight_pair_key(db: Session) -> None:
+    """Add the metric_pair_key column and its unique index on databases created before them."""
+    # create_all skips new columns and indexes on tables that already exist
+    db.execute(text("ALTER TABLE correlation_insights ADD COLUMN IF NOT EXISTS metric_pair_key VARCHAR(511)"))
+    for index in CorrelationInsight.__table__.indexes:
+        index.create(db.connection(), checkfirst=True)
+    db.commit()
+
+
+async def get_logs_for_user(db: AsyncSession, user_id: str) -> list[LogEntry]:
     """Get all log entries for a user."""
     stmt = select(LogEntry).where(LogEntry.user_id == user_id).order_by(LogEntry.date.desc())
-    return list(db.execute(stmt).scalars().all())
+    return list((await db.execute(stmt)).scalars().all())
 
 
-def get_correlation_insights_for_user(db: Session, user_id: str) -> list[CorrelationInsight]:
+async def get_recent_logs_for_user(db: AsyncSession, user_id: str, limit: int = 50) -> list[Row]:
+    """Get a user's most recent log entries, newest first, as lightweight rows.
+    
+    Only the columns the AI coach prompt reads are selected; the rows expose them
+    under the same attribute names as LogEntry without ORM identity-map overhead.
+    """
+    stmt = (
+        select(LogEntry.date, LogEntry.domain, LogEntry.metric, LogEntry.value, LogEntry.notes)
+        .where(LogEntry.user_id == user_id)
+        .order_by(LogEntry.date.desc())
+        .limit(limit)
+    )
+    return list((await db.execute(stmt)).all())
+
+
+async def get_correlation_insights_for_user(db: AsyncSession, user_id: str) -> list[CorrelationInsight]:
     """Get correlation insights for a user."""
     stmt = select(CorrelationInsight).where(CorrelationInsight.user_id == user_id).order_by(CorrelationInsight.created_at.desc())
-    return list(db.execute(stmt).scalars().all())
+    return list((await db.execute(stmt)).scalars().all())
 
 
 # Legacy functions for backward compatibility
-def create_log(db: Session, payload) -> LogEntry:
+async def create_log(db: AsyncSession, payload) -> LogEntry:
     """Legacy function for backward compatibility."""
-    log_entry = LogEntry(
-        user_id=payload.user_id,
-        date=payload.log_date,
-        domain=payload.domain,
-        metric="legacy_metric",
-        value=payload.value or 0.0,
-        notes=payload.note
-    )
-    db.add(log_entry)
-    db.commit()
-    db.refresh(log_entry)
+    log_entry = (await db.execute(_INSERT_LOG_ENTRY, {
+        "user_id": payload.user_id,
+        "date": payload.log_date,
+        "domain": payload.domain,
+        "metric": "legacy_metric",
+        "value": payload.value or 0.0,
+        "notes": payload.note
+    })).scalar_one()
+    await db.commit()
     return log_entry
 
 
+# Bump whenever a prompt below changes, so cached model responses keyed on it are invalidated
+PROMPT_VERSION = "v1"
+
+
+def _summary_messages(text: str) -> list[dict]:
+    """Chat messages asking the model for a 2-3 sentence journal summary."""
+    return [
+        {
+            "role": "system",
+            "content": "You are a helpful assistant that summarizes journal entries. Provide concise, 2-3 sentence summaries that capture the key themes, emotions, and insights from the journal entry. Focus on the most important points and maintain a supportive, understanding tone."
+        },
+        {
+            "role": "user",
+            "content": f"Please summarize this journal entry in 2-3 sentences:\n\n{text}"
+        }
+    ]
+
+
+def _fallback_summary(text: str) -> str:
+    """Simple summary used when the API call fails: the first 20 words."""
+    words = text.split()
+    if len(words) <= 20:
+        return text
+    else:
+        return " ".join(words[:20]) + "..."
+
+
 def summarize_journal(text: str) -> str:
     """
     Use OpenAI GPT API to summarize journal text into 2-3 sentences.
@@ -123,28 +238,12 @@ def summarize_journal(text: str) -> str:
     Returns:
         A 2-3 sentence summary of the journal entry
     """
-    if not settings.openai_api_key:
-        raise ValueError("OpenAI API key not configured")
-    
-    # Configure OpenAI client
-    client = openai.OpenAI(
-        api_key=settings.openai_api_key,
-        base_url=settings.openai_api_base
-    )
+    client = _openai_client()
     
     try:
         response = client.chat.completions.create(
             model=settings.openai_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that summarizes journal entries. Provide concise, 2-3 sentence summaries that capture the key themes, emotions, and insights from the journal entry. Focus on the most important points and maintain a supportive, understanding tone."
-                },
-                {
-                    "role": "user",
-                    "content": f"Please summarize this journal entry in 2-3 sentences:\n\n{text}"
-                }
-            ],
+            messages=_summary_messages(text),
             max_tokens=150,
             temperature=0.3
         )
@@ -153,17 +252,50 @@ def summarize_journal(text: str) -> str:
         
     except Exception as e:
         # Fallback to a simple summary if API call fails
-        words = text.split()
-        if len(words) <= 20:
-            return text
-        else:
-            return " ".join(words[:20]) + "..."
+        return _fallback_summary(text)
 
 
-def create_journal_summary(db: Session, user_id: str, date: date, text: str) -> JournalSummary:
+async def summarize_journal_async(text: str) -> str:
+    """Async variant of summarize_journal, so several summaries can overlap on the network."""
+    client = _async_openai_client()
+    
+    try:
+        response = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=_summary_messages(text),
+            max_tokens=150,
+            temperature=0.3
+        )
+        
+        return response.choices[0].message.content.strip()
+        
+    except Exception:
+        # Fallback to a simple summary if API call fails
+        return _fallback_summary(text)
+
+
+def journal_content_hash(text: str) -> str:
+    """Key identifying a journal text, so identical entries are only summarized once."""
+    return blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+async def get_journal_summaries_by_hash(db: AsyncSession, user_id: str, content_hashes: list[str]) -> list[JournalSummary]:
+    """Get a user's stored summaries of the journal texts with the given content hashes."""
+    stmt = select(JournalSummary).where(
+        JournalSummary.user_id == user_id,
+        JournalSummary.content_hash.in_(content_hashes)
+    )
+    return list((await db.execute(stmt)).scalars().all())
+
+
+async def create_journal_summary(db: AsyncSession, user_id: str, date: date, text: str) -> JournalSummary:
     """
     Create a journal summary and store it in the database.
     
+    If the user already had this exact text summarized, the stored summary is
+    reused instead of calling OpenAI again; resubmitting it for the same date
+    returns the existing row.
+    
     Args:
         db: Database session
         user_id: User ID
@@ -171,42 +303,93 @@ def create_journal_summary(db: Session, user_id: str, date: date, text: str) ->
         text: Journal text to summarize
         
     Returns:
-        The created JournalSummary object
+        The created (or existing) JournalSummary object
     """
-    summary_text = summarize_journal(text)
+    content_hash = journal_content_hash(text)
+    existing = await get_journal_summaries_by_hash(db, user_id, [content_hash])
+    for journal_summary in existing:
+        if journal_summary.date == date:
+            return journal_summary
+    
+    if existing:
+        summary_text = existing[0].summary_text
+    else:
+        summary_text = await summarize_journal_async(text)
     
-    journal_summary = JournalSummary(
+    stmt = insert(JournalSummary).values(
         user_id=user_id,
         date=date,
-        summary_text=summary_text
-    )
-    
-    db.add(journal_summary)
-    db.commit()
-    db.refresh(journal_summary)
+        summary_text=summary_text,
+        content_hash=content_hash
+    ).returning(JournalSummary)
+    journal_summary = (await db.execute(stmt)).scalar_one()
+    await db.commit()
     return journal_summary
 
 
-def generate_ai_coach_insights(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> str:
+async def create_journal_summaries_bulk(
+    db: AsyncSession,
+    user_id: str,
+    items: list[tuple[date, str]],
+    concurrency: int = 10
+) -> list[JournalSummary]:
     """
-    Generate AI coach insights based on user data and correlations.
+    Summarize several journal entries concurrently and store them in one INSERT.
+    
+    Texts the user already had summarized, and repeats within items, are
+    only sent to OpenAI once, as in create_journal_summary.
     
     Args:
-        logs: List of user's log entries
-        correlations: List of correlation insights
+        db: Database session
+        user_id: User ID
+        items: (date, journal text) pairs to summarize
+        concurrency: Maximum number of OpenAI requests in flight at once
         
     Returns:
-        A string containing 1-2 weekly recommendations in natural language
+        The created (or existing) JournalSummary objects, in the order of items
     """
-    if not settings.openai_api_key:
-        return "AI insights not available - OpenAI API key not configured."
+    if not items:
+        return []
+    
+    keys = [(journal_content_hash(entry_text), entry_date) for entry_date, entry_text in items]
+    stored = {
+        (journal_summary.content_hash, journal_summary.date): journal_summary
+        for journal_summary in await get_journal_summaries_by_hash(db, user_id, list({h for h, _ in keys}))
+    }
+    summary_texts = {h: journal_summary.summary_text for (h, _), journal_summary in stored.items()}
+    
+    # One OpenAI call per distinct text that has never been summarized
+    pending = {}
+    for (content_hash, _), (_, entry_text) in zip(keys, items):
+        if content_hash not in summary_texts:
+            pending.setdefault(content_hash, entry_text)
     
-    # Prepare data for analysis
-    recent_logs = sorted(logs, key=lambda x: x.date, reverse=True)[:50]  # Last 50 entries
+    semaphore = asyncio.Semaphore(concurrency)
     
+    async def summarize(entry_text: str) -> str:
+        async with semaphore:
+            return await summarize_journal_async(entry_text)
+    
+    summaries = await asyncio.gather(*(summarize(entry_text) for entry_text in pending.values()))
+    summary_texts.update(zip(pending, summaries))
+    
+    new_keys = list(dict.fromkeys(key for key in keys if key not in stored))
+    if new_keys:
+        rows = [
+            {"user_id": user_id, "date": entry_date, "summary_text": summary_texts[content_hash], "content_hash": content_hash}
+            for content_hash, entry_date in new_keys
+        ]
+        stmt = insert(JournalSummary).returning(JournalSummary, sort_by_parameter_order=True)
+        stored.update(zip(new_keys, (await db.execute(stmt, rows)).scalars().all()))
+        await db.commit()
+    return [stored[key] for key in keys]
+
+
+def _ai_coach_messages(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> list[dict]:
+    """Chat messages asking the model for 1-2 weekly recommendations."""
     # Create a summary of recent activity
     activity_summary = []
-    for log in recent_logs:
+    for log in logs:
         activity_summary.append(f"{log.date}: {log.domain.value} - {log.metric}: {log.value}")
         if log.notes:
             activity_summary.append(f"  Notes: {log.notes}")
@@ -218,14 +401,7 @@ def generate_ai_coach_insights(logs: list[LogEntry], correlations: list[Correlat
         for corr in correlations[:5]:  # Top 5 correlations
             correlation_text += f"- {corr.description} (correlation: {corr.correlation_score:.2f})\n"
     
-    # Configure OpenAI client
-    client = openai.OpenAI(
-        api_key=settings.openai_api_key,
-        base_url=settings.openai_api_base
-    )
-    
-    try:
-        prompt = f"""
+    prompt = f"""
 You are an AI coach analyzing a user's wellness data. Based on their recent activity and patterns, provide 1-2 specific, actionable weekly recommendations.
 
 Recent Activity:
@@ -241,19 +417,55 @@ Please provide 1-2 specific, actionable recommendations for the upcoming week. F
 
 Format your response as natural, conversational advice (2-3 sentences per recommendation).
 """
+    
+    return [
+        {
+            "role": "system",
+            "content": "You are a supportive AI wellness coach. Provide specific, actionable advice based on user data patterns. Be encouraging and practical."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+def generate_ai_coach_insights(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> str:
+    """
+    Generate AI coach insights based on user data and correlations.
+    
+    Args:
+        logs: User's recent log entries, newest first; LogEntry objects or the
+            column rows from get_recent_logs_for_user
+        correlations: List of correlation insights
         
+    Returns:
+        A string containing 1-2 weekly recommendations in natural language
+    """
+    client = _openai_client()
+    
+    try:
         response = client.chat.completions.create(
             model=settings.openai_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a supportive AI wellness coach. Provide specific, actionable advice based on user data patterns. Be encouraging and practical."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
+            messages=_ai_coach_messages(logs, correlations),
+            max_tokens=300,
+            temperature=0.4
+        )
+        
+        return response.choices[0].message.content.strip()
+        
+    except Exception as e:
+        return f"Unable to generate AI insights at this time. Error: {str(e)}"
+
+
+async def generate_ai_coach_insights_async(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> str:
+    """Async variant of generate_ai_coach_insights for callers already on the event loop."""
+    client = _async_openai_client()
+    
+    try:
+        response = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=_ai_coach_messages(logs, correlations),
             max_tokens=300,
             temperature=0.4
         )
@@ -264,7 +476,75 @@ Format your response as natural, conversational advice (2-3 sentences per recomm
         return f"Unable to generate AI insights at this time. Error: {str(e)}"
 
 
-def get_journal_summaries_for_user(db: Session, user_id: str) -> list[JournalSummary]:
+async def stream_ai_coach_insights(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> AsyncIterator[str]:
+    """
+    Stream AI coach insights as the model produces them.
+    
+    Same prompt as generate_ai_coach_insights, but text is yielded chunk by
+    chunk so the client can render the first words without waiting for all
+    300 tokens.
+    
+    Args:
+        logs: User's recent log entries, newest first
+        correlations: List of correlation insights
+        
+    Yields:
+        Successive pieces of the recommendation text
+    """
+    client = _async_openai_client()
+    
+    try:
+        stream = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=_ai_coach_messages(logs, correlations),
+            max_tokens=300,
+            temperature=0.4,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+        
+    except Exception as e:
+        yield f"Unable to generate AI insights at this time. Error: {str(e)}"
+
+
+def _summarize_journal_without_key(text: str) -> str:
+    """Stand-in for summarize_journal when no OpenAI API key is configured."""
+    raise ValueError("OpenAI API key not configured")
+
+
+async def _summarize_journal_async_without_key(text: str) -> str:
+    """Stand-in for summarize_journal_async when no OpenAI API key is configured."""
+    raise ValueError("OpenAI API key not configured")
+
+
+def _ai_coach_insights_without_key(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> str:
+    """Stand-in for generate_ai_coach_insights when no OpenAI API key is configured."""
+    return "AI insights not available - OpenAI API key not configured."
+
+
+async def _ai_coach_insights_async_without_key(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> str:
+    """Stand-in for generate_ai_coach_insights_async when no OpenAI API key is configured."""
+    return _ai_coach_insights_without_key(logs, correlations)
+
+
+async def _stream_ai_coach_insights_without_key(logs: list[LogEntry], correlations: list[CorrelationInsight]) -> AsyncIterator[str]:
+    """Stand-in for stream_ai_coach_insights when no OpenAI API key is configured."""
+    yield _ai_coach_insights_without_key(logs, correlations)
+
+
+# Settings are fixed for the life of the process, so decide once at import
+# whether the AI functions can reach OpenAI instead of re-checking per call
+if not settings.openai_api_key:
+    summarize_journal = _summarize_journal_without_key
+    summarize_journal_async = _summarize_journal_async_without_key
+    generate_ai_coach_insights = _ai_coach_insights_without_key
+    generate_ai_coach_insights_async = _ai_coach_insights_async_without_key
+    stream_ai_coach_insights = _stream_ai_coach_insights_without_key
+
+
+async def get_journal_summaries_for_user(db: AsyncSession, user_id: str) -> list[JournalSummary]:
     """Get journal summaries for a user."""
     stmt = select(JournalSummary).where(JournalSummary.user_id == user_id).order_by(JournalSummary.date.desc())
-    return list(db.execute(stmt).scalars().all()) 
\ No newline at end of file
+    return list((await db.execute(stmt)).scalars().all()) 
\ No newline at end of file
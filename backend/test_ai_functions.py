@@ -1,121 +1,399 @@
 #!/usr/bin/env python3
 """
-Test script for the AI functions: summarize_journal and generate_ai_coach_insights
+Test script for the AI functions: summarize_journal and generate_ai_coach_insights (async variants)
 """
 
+import asyncio
+import hashlib
+import json
+import logging
+import logging.handlers
 import os
 import sys
+import tempfile
+import time
 from datetime import date
-from sqlalchemy.orm import Session
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple
 
-# Add the app directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+import pytest
 
-from app.services import summarize_journal, generate_ai_coach_insights
-from app.models import LogEntry, CorrelationInsight, DomainEnum
-from app.core.config import settings
+if TYPE_CHECKING:
+    from app.models import DomainEnum
 
-def test_summarize_journal():
-    """Test the journal summarization function."""
-    print("Testing journal summarization...")
-    
-    # Sample journal text
-    journal_text = """
+# These tests never issue or verify JWTs, so any signing key will do
+os.environ.setdefault("SECRET_KEY", "test-only-secret-key-not-for-production")
+
+# app modules (SQLAlchemy, pydantic, openai) are imported inside the tests that use them,
+# so loading this file stays cheap
+
+log = logging.getLogger(__name__)
+
+# Upper bound on concurrent OpenAI calls when main() runs the scenarios
+AI_TEST_CONCURRENCY = 10
+
+# Batch API polling for the nightly regression run (results can take up to the 24h completion window)
+BATCH_POLL_INTERVAL = 30
+BATCH_TIMEOUT = float(os.environ.get("BATCH_TIMEOUT", 24 * 60 * 60))
+
+# On-disk cache of model responses, so re-running the suite on the same fixtures skips the API
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "crosscoach_llm_cache.json"))
+LLM_CACHE_TTL_MS = 7 * 24 * 60 * 60 * 1000
+
+# In-process copy of the cache file, loaded on first use
+_llm_cache = None
+
+# generate_ai_coach_insights returns these notices instead of model output on failure or without a key
+INSIGHTS_NOTICE_PREFIXES = ("Unable to generate AI insights", "AI insights not available")
+
+# Sample journal text
+JOURNAL_TEXT = """
     Today was quite challenging. I had a difficult conversation with my manager about project deadlines, 
     and I'm feeling overwhelmed with the workload. However, I did manage to go for a 30-minute walk 
     during lunch which helped clear my mind. I also spent some time reading a book before bed, 
     which was relaxing. I'm trying to focus on the positive aspects of the day and practice gratitude.
     """
-    
+
+def configure_logging():
+    """Send script output through one buffered handler instead of a stdout write per line.
+
+    Records are flushed to stdout in batches of 64, immediately on errors, and at exit.
+    Under pytest this is not called, so output goes to pytest's log capture (caplog).
+    """
+    log.addHandler(logging.handlers.MemoryHandler(capacity=64, target=logging.StreamHandler(sys.stdout)))
+    log.setLevel(logging.INFO)
+
+def llm_cache_key(text: str) -> str:
+    """Cache key for a model input under the current prompt version."""
+    from app.services import PROMPT_VERSION
+    return hashlib.sha256((PROMPT_VERSION + "|" + text).encode()).hexdigest()
+
+def coach_insights_cache_key(logs, correlations) -> str:
+    """Cache key for AI coach inputs: the canonical JSON of the exact messages sent to the model."""
+    from app.services import _ai_coach_messages
+    return llm_cache_key(json.dumps(_ai_coach_messages(logs, correlations), sort_keys=True))
+
+def _load_llm_cache() -> dict:
+    global _llm_cache
+    if _llm_cache is None:
+        try:
+            with open(LLM_CACHE_PATH) as f:
+                _llm_cache = json.load(f)
+        except (OSError, ValueError):
+            _llm_cache = {}
+    return _llm_cache
+
+def llm_cache_lookup(key: str):
+    """Return the cached response for key, or None if missing or older than the TTL."""
+    entry = _load_llm_cache().get(key)
+    if entry is None or time.time() * 1000 - entry["ts"] > LLM_CACHE_TTL_MS:
+        return None
+    return entry["value"]
+
+def llm_cache_update(key: str, value: str) -> None:
+    """Store a response in memory and in the cache file."""
+    cache = _load_llm_cache()
+    cache[key] = {"value": value, "ts": int(time.time() * 1000)}
     try:
-        summary = summarize_journal(journal_text)
-        print(f"Original text: {journal_text.strip()}")
-        print(f"Summary: {summary}")
-        print("✓ Journal summarization test completed\n")
-    except Exception as e:
-        print(f"✗ Journal summarization test failed: {e}\n")
+        # Write then rename so an interrupted run never leaves a truncated cache
+        tmp_path = f"{LLM_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, LLM_CACHE_PATH)
+    except OSError as e:
+        log.warning(f"Could not write LLM cache: {e}")
+
+class LogFixture(NamedTuple):
+    """The LogEntry fields the coach prompt reads, matching the rows /ai-insights passes in."""
+    date: date
+    domain: "DomainEnum"
+    metric: str
+    value: float
+    notes: str
+
+class CorrelationFixture(NamedTuple):
+    """The CorrelationInsight fields the coach prompt reads."""
+    description: str
+    correlation_score: float
+
+@lru_cache(maxsize=None)
+def sample_coach_fixtures():
+    """Sample log entries and correlation insights for the AI coach tests.
+
+    Plain tuples rather than ORM instances: the prompt builder only reads attributes, so there is
+    no mapper instrumentation to pay for. Built once on first use and shared by every test.
+    """
+    from app.models import DomainEnum
 
-def test_ai_coach_insights():
-    """Test the AI coach insights function."""
-    print("Testing AI coach insights...")
-    
     # Sample log entries
     sample_logs = [
-        LogEntry(
-            id="1",
-            user_id="test-user",
-            date=date(2024, 1, 15),
-            domain=DomainEnum.fitness,
-            metric="workout_duration",
-            value=45.0,
-            notes="Morning run, felt energized"
-        ),
-        LogEntry(
-            id="2", 
-            user_id="test-user",
-            date=date(2024, 1, 15),
-            domain=DomainEnum.sleep,
-            metric="sleep_hours",
-            value=7.5,
-            notes="Good quality sleep"
-        ),
-        LogEntry(
-            id="3",
-            user_id="test-user", 
-            date=date(2024, 1, 14),
-            domain=DomainEnum.fitness,
-            metric="workout_duration",
-            value=30.0,
-            notes="Quick workout, busy day"
-        ),
-        LogEntry(
-            id="4",
-            user_id="test-user",
-            date=date(2024, 1, 14),
-            domain=DomainEnum.sleep,
-            metric="sleep_hours", 
-            value=6.0,
-            notes="Woke up early for meeting"
-        )
+        LogFixture(date(2024, 1, 15), DomainEnum.fitness, "workout_duration", 45.0, "Morning run, felt energized"),
+        LogFixture(date(2024, 1, 15), DomainEnum.sleep, "sleep_hours", 7.5, "Good quality sleep"),
+        LogFixture(date(2024, 1, 14), DomainEnum.fitness, "workout_duration", 30.0, "Quick workout, busy day"),
+        LogFixture(date(2024, 1, 14), DomainEnum.sleep, "sleep_hours", 6.0, "Woke up early for meeting")
     ]
     
     # Sample correlation insights
     sample_correlations = [
-        CorrelationInsight(
-            id="1",
-            user_id="test-user",
-            description="Higher sleep hours correlate with longer workout duration",
-            correlation_score=0.75
-        ),
-        CorrelationInsight(
-            id="2", 
-            user_id="test-user",
-            description="Morning workouts tend to be more consistent",
-            correlation_score=0.82
-        )
+        CorrelationFixture("Higher sleep hours correlate with longer workout duration", 0.75),
+        CorrelationFixture("Morning workouts tend to be more consistent", 0.82)
     ]
     
+    return sample_logs, sample_correlations
+
+@lru_cache(maxsize=None)
+def sample_coach_cache_key() -> str:
+    """Response cache key for the sample coach fixtures, serialised once."""
+    return coach_insights_cache_key(*sample_coach_fixtures())
+
+async def run_summarize_journal_test():
+    """Test the journal summarization function."""
+    from app.services import summarize_journal_async, _fallback_summary
+    log.info("Testing journal summarization...")
+    
+    journal_text = JOURNAL_TEXT
+    
+    key = llm_cache_key(journal_text)
+    summary = llm_cache_lookup(key)
+    if summary is None:
+        summary = await summarize_journal_async(journal_text)
+        # A failed API call falls back to truncation; only cache real model output
+        if summary != _fallback_summary(journal_text):
+            llm_cache_update(key, summary)
+    else:
+        log.info("(cached response)")
+    log.info(f"Original text: {journal_text.strip()}")
+    log.info(f"Summary: {summary}")
+    log.info("✓ Journal summarization test completed\n")
+    return summary
+
+async def run_ai_coach_insights_test():
+    """Test the AI coach insights function."""
+    from app.services import generate_ai_coach_insights_async
+    log.info("Testing AI coach insights...")
+    
+    sample_logs, sample_correlations = sample_coach_fixtures()
+    
+    key = sample_coach_cache_key()
+    insights = llm_cache_lookup(key)
+    if insights is None:
+        insights = await generate_ai_coach_insights_async(sample_logs, sample_correlations)
+        # Failed or keyless calls return a notice instead of model output; don't cache those
+        if not insights.startswith(INSIGHTS_NOTICE_PREFIXES):
+            llm_cache_update(key, insights)
+    else:
+        log.info("(cached response)")
+    log.info(f"Generated insights: {insights}")
+    log.info("✓ AI coach insights test completed\n")
+    return insights
+
+def batch_requests() -> list[dict]:
+    """One Batch API request per fixture, with the same parameters the service functions use."""
+    from app.services import _summary_messages, _ai_coach_messages
+    from app.core.config import get_settings
+    model = get_settings().openai_model
+    sample_logs, sample_correlations = sample_coach_fixtures()
+    return [
+        {
+            "custom_id": llm_cache_key(JOURNAL_TEXT),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model, "messages": _summary_messages(JOURNAL_TEXT), "max_tokens": 150, "temperature": 0.3}
+        },
+        {
+            "custom_id": sample_coach_cache_key(),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model, "messages": _ai_coach_messages(sample_logs, sample_correlations), "max_tokens": 300, "temperature": 0.4}
+        }
+    ]
+
+def run_batch(requests: list[dict]) -> dict:
+    """Submit requests as one Batch API job, wait for it, and return the responses by custom_id."""
+    from app.services import _openai_client
+    client = _openai_client()
+    
+    input_file = client.files.create(
+        file=("requests.jsonl", "\n".join(json.dumps(r) for r in requests).encode()),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    
+    deadline = time.monotonic() + BATCH_TIMEOUT
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        if time.monotonic() > deadline:
+            client.batches.cancel(batch.id)
+            raise TimeoutError(f"Batch {batch.id} still {batch.status} after {BATCH_TIMEOUT}s")
+        time.sleep(BATCH_POLL_INTERVAL)
+        batch = client.batches.retrieve(batch.id)
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+    
+    results = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        item = json.loads(line)
+        if item.get("error") is None and item["response"]["status_code"] == 200:
+            results[item["custom_id"]] = item["response"]["body"]["choices"][0]["message"]["content"].strip()
+    return results
+
+def require_openai_key():
+    """Skip the calling test when no OpenAI API key is configured."""
+    from app.core.config import get_settings
+    if not get_settings().openai_api_key:
+        pytest.skip("OpenAI API key not configured")
+
+def require_database():
+    """Skip the calling test when the configured Postgres database is unreachable."""
+    from sqlalchemy import text
+    from app.db import engine
     try:
-        insights = generate_ai_coach_insights(sample_logs, sample_correlations)
-        print(f"Generated insights: {insights}")
-        print("✓ AI coach insights test completed\n")
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
     except Exception as e:
-        print(f"✗ AI coach insights test failed: {e}\n")
+        pytest.skip(f"Database not reachable: {e}")
+
+@pytest.mark.batch
+def test_batch_regression():
+    """Nightly: send every fixture through the Batch API in one job and warm the response cache."""
+    require_openai_key()
+    
+    requests = batch_requests()
+    results = run_batch(requests)
+    
+    # custom_ids are the response cache keys, so interactive runs reuse the nightly answers
+    for request in requests:
+        assert results.get(request["custom_id"]), f"No batch response for {request['custom_id']}"
+        llm_cache_update(request["custom_id"], results[request["custom_id"]])
+
+@lru_cache(maxsize=1)
+def _event_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.new_event_loop()
+
+def run_async(coro):
+    """Run coro on one loop for the whole process.
+
+    The shared async OpenAI client pools connections bound to the loop that opened them,
+    so a fresh asyncio.run() per test would leave the next test with dead connections.
+    """
+    return _event_loop().run_until_complete(coro)
+
+def test_summarize_journal():
+    from app.services import _fallback_summary
+    require_openai_key()
+    summary = run_async(run_summarize_journal_test())
+    assert summary and summary != _fallback_summary(JOURNAL_TEXT), "Summarization fell back to truncation"
+
+def test_ai_coach_insights():
+    require_openai_key()
+    insights = run_async(run_ai_coach_insights_test())
+    assert insights and not insights.startswith(INSIGHTS_NOTICE_PREFIXES), insights
+
+async def run_journal_summaries_bulk_test():
+    """Bulk-summarize entries that repeat each other and an already stored text, then clean up."""
+    import uuid
+    from sqlalchemy import delete, select
+    from app import services
+    from app.db import AsyncSessionLocal
+    from app.models import JournalSummary, User
+    from app.schemas import UserRegister
+
+    async with AsyncSessionLocal() as db:
+        user = await services.create_user(db, UserRegister(
+            email=f"bulk-{uuid.uuid4().hex[:8]}@example.com", name="Bulk Test", password="testpassword123"
+        ))
+        user_id = str(user.id)
+        try:
+            existing = await services.create_journal_summary(db, user_id, date(2024, 1, 13), "Rest day, long walk.")
+            items = [
+                (date(2024, 1, 13), "Rest day, long walk."),
+                (date(2024, 1, 14), "Hard interval session."),
+                (date(2024, 1, 15), "Hard interval session."),
+                (date(2024, 1, 14), "Hard interval session."),
+            ]
+            summaries = await services.create_journal_summaries_bulk(db, user_id, items)
+            stored = (await db.execute(
+                select(JournalSummary.date, JournalSummary.summary_text)
+                .where(JournalSummary.user_id == user_id)
+                .order_by(JournalSummary.date)
+            )).all()
+            return existing, items, summaries, stored
+        finally:
+            await db.execute(delete(JournalSummary).where(JournalSummary.user_id == user_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+
+def test_create_journal_summaries_bulk(monkeypatch):
+    """Each distinct new text is summarized once and every (text, date) is stored once."""
+    require_database()
+    from app import services
+
+    calls = []
+    async def fake_summarize(text):
+        calls.append(text)
+        return f"summary: {text}"
+    monkeypatch.setattr(services, "summarize_journal_async", fake_summarize)
+
+    existing, items, summaries, stored = run_async(run_journal_summaries_bulk_test())
+
+    # One call for the pre-stored entry, one for the repeated new text
+    assert calls == ["Rest day, long walk.", "Hard interval session."]
+    assert [s.date for s in summaries] == [entry_date for entry_date, _ in items]
+    assert [s.summary_text for s in summaries] == [f"summary: {entry_text}" for _, entry_text in items]
+    assert summaries[0].id == existing.id
+    assert summaries[1].id == summaries[3].id
+    assert stored == [
+        (date(2024, 1, 13), "summary: Rest day, long walk."),
+        (date(2024, 1, 14), "summary: Hard interval session."),
+        (date(2024, 1, 15), "summary: Hard interval session."),
+    ]
+
+# Scenario coroutines run by main(); add new fixtures here
+AI_TEST_CASES = [run_summarize_journal_test, run_ai_coach_insights_test]
+
+async def run_all_tests(cases=AI_TEST_CASES, concurrency=AI_TEST_CONCURRENCY):
+    """Run the AI tests concurrently, with at most `concurrency` OpenAI calls in flight.
+
+    The cap keeps a growing fixture matrix under the API rate limit; 429s and 5xx responses
+    that still occur are retried with exponential backoff by the OpenAI client itself.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_case(case):
+        async with semaphore:
+            try:
+                return await case()
+            except Exception as e:
+                log.error(f"✗ {case.__name__} failed: {e}\n")
+                raise
+    
+    return await asyncio.gather(*(run_case(case) for case in cases), return_exceptions=True)
 
 def main():
     """Run all tests."""
-    print("AI Functions Test Suite")
-    print("=" * 50)
+    configure_logging()
+    from app.core.config import get_settings
+    settings = get_settings()
+
+    log.info("AI Functions Test Suite")
+    log.info("=" * 50)
     
     # Check if OpenAI API key is configured
     if not settings.openai_api_key:
-        print("⚠️  OpenAI API key not configured. Set OPENAI_API_KEY environment variable.")
-        print("Tests will fail but you can see the function structure.\n")
+        log.warning("⚠️  OpenAI API key not configured. Set OPENAI_API_KEY environment variable.")
+        log.warning("Tests will fail but you can see the function structure.\n")
+    
+    # Pay for client construction (env parsing, httpx pools) before the tests start
+    from app.services import warm_openai_clients
+    warm_openai_clients()
     
-    test_summarize_journal()
-    test_ai_coach_insights()
+    run_async(run_all_tests())
     
-    print("Test suite completed!")
+    log.info("Test suite completed!")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
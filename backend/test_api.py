@@ -2,129 +2,374 @@
 """
 Simple test script for the CrossCoach API
 """
-import requests
+import asyncio
+import atexit
+import functools
 import json
+import logging
+import logging.handlers
+import os
+import sqlite3
+import sys
+import time
+import uuid
+import httpx
+import pytest
 from datetime import date
 
-BASE_URL = "http://localhost:8000/api"
+try:
+    import orjson
+except ImportError:  # orjson is optional; responses are then parsed with the stdlib decoder
+    orjson = None
 
-def test_api():
+# 127.0.0.1 rather than localhost skips name resolution (and an IPv6 attempt first on some hosts)
+SERVER_URL = "http://127.0.0.1:8000"
+BASE_URL = f"{SERVER_URL}/api"
+HEALTH_URL = f"{SERVER_URL}/health"
+
+log = logging.getLogger(__name__)
+
+# A fresh account per process, so reruns and parallel pytest workers never collide on registration.
+# Reruns against a deterministic (seeded) server can pin one with TEST_API_EMAIL instead.
+TEST_EMAIL = os.environ.get("TEST_API_EMAIL") or f"test-{uuid.uuid4().hex[:8]}@example.com"
+TEST_PASSWORD = "testpassword123"
+
+REGISTER_DATA = {"email": TEST_EMAIL, "name": "Test User", "password": TEST_PASSWORD}
+LOGIN_DATA = {"email": TEST_EMAIL, "password": TEST_PASSWORD}
+LOG_DATA = {
+    "date": str(date.today()),
+    "domain": "fitness",
+    "metric": "workout_duration",
+    "value": 45.0,
+    "notes": "Morning workout"
+}
+JOURNAL_DATA = {
+    "date": str(date.today()),
+    "content": "Today was a great day! I felt energized and productive.",
+    "mood_score": 8.5
+}
+
+# Encode each payload once rather than on every request
+REGISTER_BODY = json.dumps(REGISTER_DATA).encode()
+LOGIN_BODY = json.dumps(LOGIN_DATA).encode()
+LOG_BODY = json.dumps(LOG_DATA).encode()
+JOURNAL_BODY = json.dumps(JOURNAL_DATA).encode()
+
+# Per-attempt timeout and retry policy for every request; only idempotent methods are
+# retried, since a POST that timed out may already have registered or logged once
+REQUEST_TIMEOUT = 10.0
+RETRIES = 3
+RETRY_DELAY = 0.2
+RETRY_STATUSES = {502, 503, 504}
+RETRY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Optional sqlite cache of GET responses (TEST_API_CACHE=path) so repeat runs skip idempotent reads
+RESPONSE_CACHE_PATH = os.environ.get("TEST_API_CACHE")
+RESPONSE_CACHE_TTL = 300
+
+# Optional per-request latency trace (TEST_API_TRACE=path): one JSON line per call, appended at exit
+TRACE_PATH = os.environ.get("TEST_API_TRACE")
+TRACE = []
+
+
+def configure_logging():
+    """Send script output through one buffered handler instead of a stdout write per line.
+
+    Records are flushed to stdout in batches of 64, immediately on errors, and at exit.
+    Under pytest this is not called, so output goes to pytest's log capture (caplog).
+    """
+    log.addHandler(logging.handlers.MemoryHandler(capacity=64, target=logging.StreamHandler(sys.stdout)))
+    log.setLevel(logging.INFO)
+
+
+def make_client():
+    """Build the pooled keep-alive client shared by every test call.
+
+    HTTP/2 is negotiated over TLS (e.g. behind a proxy), letting the concurrent
+    calls share one connection; plain-http dev servers keep using HTTP/1.1.
+    """
+    return httpx.AsyncClient(
+        base_url=BASE_URL,
+        http2=True,
+        headers={"Content-Type": "application/json"},
+        limits=httpx.Limits(max_keepalive_connections=4, max_connections=8)
+    )
+
+
+def with_retries(retries=RETRIES, retry_delay=RETRY_DELAY, timeout=REQUEST_TIMEOUT):
+    """Retry an idempotent request coroutine on timeouts, connection errors and gateway errors with exponential backoff."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(client, method, path, **kwargs):
+            attempts = retries if method in RETRY_METHODS else 1
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    response = await asyncio.wait_for(func(client, method, path, **kwargs), timeout)
+                except (asyncio.TimeoutError, httpx.TransportError):
+                    if last_attempt:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        return response
+                await asyncio.sleep(retry_delay * 2 ** attempt)
+        return wrapper
+    return decorator
+
+
+@functools.lru_cache(maxsize=1)
+def _response_cache() -> sqlite3.Connection:
+    db = sqlite3.connect(RESPONSE_CACHE_PATH)
+    db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content BLOB, ts REAL)")
+    return db
+
+
+def response_cache_lookup(path):
+    """Return a cached GET body for the test account, or None if missing or older than the TTL."""
+    row = _response_cache().execute(
+        "SELECT content FROM responses WHERE key = ? AND ts > ?",
+        (f"{TEST_EMAIL} {path}", time.time() - RESPONSE_CACHE_TTL)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def response_cache_update(path, content):
+    with _response_cache() as db:
+        db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (f"{TEST_EMAIL} {path}", content, time.time()))
+
+
+@with_retries()
+async def send(client, method, path, **kwargs):
+    return await client.request(method, path, **kwargs)
+
+
+async def request(client, method, path, **kwargs):
+    """Send one API request through the shared client, serving GETs from the response cache when enabled."""
+    cacheable = RESPONSE_CACHE_PATH and method == "GET"
+    if cacheable:
+        content = response_cache_lookup(path)
+        if content is not None:
+            return httpx.Response(
+                200,
+                content=content,
+                headers={"Content-Type": "application/json"},
+                request=client.build_request(method, path)
+            )
+    start = time.perf_counter_ns()
+    response = await send(client, method, path, **kwargs)
+    if TRACE_PATH:
+        TRACE.append({
+            "method": method,
+            "path": path,
+            "status": response.status_code,
+            "elapsed_ns": time.perf_counter_ns() - start
+        })
+    if cacheable and response.status_code == 200:
+        response_cache_update(path, response.content)
+    return response
+
+
+@atexit.register
+def write_trace():
+    if TRACE_PATH and TRACE:
+        # Appending lets parallel pytest workers and repeated runs share one file
+        with open(TRACE_PATH, "a") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in TRACE)
+
+
+async def run_tests():
     """Test the main API endpoints."""
-    
-    print("Testing CrossCoach API...")
-    
-    # Test 1: Register a new user
-    print("\n1. Testing user registration...")
-    register_data = {
-        "email": "test@example.com",
-        "name": "Test User",
-        "password": "testpassword123"
-    }
-    
-    try:
-        response = requests.post(f"{BASE_URL}/register", json=register_data)
-        print(f"Register response: {response.status_code}")
-        if response.status_code == 200:
-            user_data = response.json()
-            print(f"User created: {user_data['email']}")
-        else:
-            print(f"Register failed: {response.text}")
+
+    log.info("Testing CrossCoach API...")
+
+    # One client for every call, so requests reuse keep-alive connections
+    async with make_client() as client:
+        # Open the pooled connection before the first real call, so test 1 doesn't pay for it
+        try:
+            await client.get(HEALTH_URL, timeout=1.0)
+        except httpx.HTTPError:
+            pass
+
+        # Test 1: Register a new user
+        log.info("\n1. Testing user registration...")
+        try:
+            response = await request(client, "POST", "/register", content=REGISTER_BODY)
+            log.info(f"Register response: {response.status_code}")
+            if response.status_code == 200:
+                user_data = parse_json(response)
+                log.info(f"User created: {user_data['email']}")
+            elif already_registered(response):
+                log.info(f"User already registered: {TEST_EMAIL}")
+            else:
+                log.error(f"Register failed: {response.text}")
+                return
+        except Exception as e:
+            log.error(f"Register error: {e}")
             return
-    except Exception as e:
-        print(f"Register error: {e}")
-        return
-    
-    # Test 2: Login
-    print("\n2. Testing user login...")
-    login_data = {
-        "email": "test@example.com",
-        "password": "testpassword123"
-    }
-    
-    try:
-        response = requests.post(f"{BASE_URL}/login", json=login_data)
-        print(f"Login response: {response.status_code}")
-        if response.status_code == 200:
-            token_data = response.json()
-            access_token = token_data['access_token']
-            print("Login successful, got access token")
-        else:
-            print(f"Login failed: {response.text}")
+
+        # Test 2: Login
+        log.info("\n2. Testing user login...")
+        try:
+            response = await request(client, "POST", "/login", content=LOGIN_BODY)
+            log.info(f"Login response: {response.status_code}")
+            if response.status_code == 200:
+                token_data = parse_json(response)
+                access_token = token_data['access_token']
+                log.info("Login successful, got access token")
+            else:
+                log.error(f"Login failed: {response.text}")
+                return
+        except Exception as e:
+            log.error(f"Login error: {e}")
             return
-    except Exception as e:
-        print(f"Login error: {e}")
-        return
-    
-    # Set up headers for authenticated requests
-    headers = {"Authorization": f"Bearer {access_token}"}
-    
-    # Test 3: Add a log entry
-    print("\n3. Testing log entry creation...")
-    log_data = {
-        "date": str(date.today()),
-        "domain": "fitness",
-        "metric": "workout_duration",
-        "value": 45.0,
-        "notes": "Morning workout"
-    }
-    
-    try:
-        response = requests.post(f"{BASE_URL}/log", json=log_data, headers=headers)
-        print(f"Log entry response: {response.status_code}")
-        if response.status_code == 200:
-            log_entry = response.json()
-            print(f"Log entry created: {log_entry['metric']} = {log_entry['value']}")
-        else:
-            print(f"Log entry failed: {response.text}")
-    except Exception as e:
-        print(f"Log entry error: {e}")
-    
-    # Test 4: Add a journal entry
-    print("\n4. Testing journal entry creation...")
-    journal_data = {
-        "date": str(date.today()),
-        "content": "Today was a great day! I felt energized and productive.",
-        "mood_score": 8.5
-    }
-    
-    try:
-        response = requests.post(f"{BASE_URL}/journal", json=journal_data, headers=headers)
-        print(f"Journal entry response: {response.status_code}")
-        if response.status_code == 200:
-            journal_entry = response.json()
-            print(f"Journal entry created with mood score: {journal_entry['value']}")
-        else:
-            print(f"Journal entry failed: {response.text}")
-    except Exception as e:
-        print(f"Journal entry error: {e}")
-    
-    # Test 5: Get user logs
-    print("\n5. Testing get user logs...")
-    try:
-        response = requests.get(f"{BASE_URL}/logs", headers=headers)
-        print(f"Get logs response: {response.status_code}")
-        if response.status_code == 200:
-            logs = response.json()
-            print(f"Retrieved {len(logs)} log entries")
-        else:
-            print(f"Get logs failed: {response.text}")
-    except Exception as e:
-        print(f"Get logs error: {e}")
-    
-    # Test 6: Get insights
-    print("\n6. Testing get insights...")
+
+        # Authenticate every following request on the shared client
+        client.headers["Authorization"] = f"Bearer {access_token}"
+
+        # Tests 3-6 only depend on the login, so send them concurrently;
+        # the logs listing may or may not include the entries created alongside it
+        log_result, journal_result, logs_result, insights_result = await asyncio.gather(
+            request(client, "POST", "/log", content=LOG_BODY),
+            request(client, "POST", "/journal", content=JOURNAL_BODY),
+            request(client, "GET", "/logs"),
+            request(client, "GET", "/insights"),
+            return_exceptions=True
+        )
+
+        # Test 3: Add a log entry
+        log.info("\n3. Testing log entry creation...")
+        try:
+            if isinstance(log_result, Exception):
+                raise log_result
+            log.info(f"Log entry response: {log_result.status_code}")
+            if log_result.status_code == 200:
+                log_entry = parse_json(log_result)
+                log.info(f"Log entry created: {log_entry['metric']} = {log_entry['value']}")
+            else:
+                log.error(f"Log entry failed: {log_result.text}")
+        except Exception as e:
+            log.error(f"Log entry error: {e}")
+
+        # Test 4: Add a journal entry
+        log.info("\n4. Testing journal entry creation...")
+        try:
+            if isinstance(journal_result, Exception):
+                raise journal_result
+            log.info(f"Journal entry response: {journal_result.status_code}")
+            if journal_result.status_code == 200:
+                journal_entry = parse_json(journal_result)
+                log.info(f"Journal entry created with mood score: {journal_entry['value']}")
+            else:
+                log.error(f"Journal entry failed: {journal_result.text}")
+        except Exception as e:
+            log.error(f"Journal entry error: {e}")
+
+        # Test 5: Get user logs
+        log.info("\n5. Testing get user logs...")
+        try:
+            if isinstance(logs_result, Exception):
+                raise logs_result
+            log.info(f"Get logs response: {logs_result.status_code}")
+            if logs_result.status_code == 200:
+                logs = parse_json(logs_result)
+                log.info(f"Retrieved {len(logs)} log entries")
+            else:
+                log.error(f"Get logs failed: {logs_result.text}")
+        except Exception as e:
+            log.error(f"Get logs error: {e}")
+
+        # Test 6: Get insights
+        log.info("\n6. Testing get insights...")
+        try:
+            if isinstance(insights_result, Exception):
+                raise insights_result
+            log.info(f"Get insights response: {insights_result.status_code}")
+            if insights_result.status_code == 200:
+                insights = parse_json(insights_result)
+                log.info(f"Retrieved {len(insights)} insights")
+            else:
+                log.error(f"Get insights failed: {insights_result.text}")
+        except Exception as e:
+            log.error(f"Get insights error: {e}")
+
+    log.info("\nAPI testing completed!")
+
+
+def parse_json(response):
+    """Decode a response body, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
+def already_registered(response):
+    """True when a pinned TEST_API_EMAIL account exists from an earlier run."""
+    return "TEST_API_EMAIL" in os.environ and response.status_code == 400 and "already exists" in response.text
+
+
+async def call(method, path, token=None, **kwargs):
+    """Send a single request on its own client, optionally authenticated."""
+    async with make_client() as client:
+        if token:
+            client.headers["Authorization"] = f"Bearer {token}"
+        return await request(client, method, path, **kwargs)
+
+
+# pytest entry points: one test per endpoint, sharing a single registration and login.
+# Run in parallel with `pytest -n auto --dist=loadfile test_api.py` (pytest-xdist);
+# loadfile keeps this module on one worker so the fixtures below run once.
+
+@pytest.fixture(scope="module")
+def registered_user():
     try:
-        response = requests.get(f"{BASE_URL}/insights", headers=headers)
-        print(f"Get insights response: {response.status_code}")
-        if response.status_code == 200:
-            insights = response.json()
-            print(f"Retrieved {len(insights)} insights")
-        else:
-            print(f"Get insights failed: {response.text}")
-    except Exception as e:
-        print(f"Get insights error: {e}")
-    
-    print("\nAPI testing completed!")
+        response = asyncio.run(call("POST", "/register", content=REGISTER_BODY))
+    except httpx.TransportError as e:
+        pytest.skip(f"API server not reachable at {BASE_URL}: {e}")
+    if already_registered(response):
+        return {"email": TEST_EMAIL}
+    assert response.status_code == 200, response.text
+    return parse_json(response)
+
+
+@pytest.fixture(scope="module")
+def access_token(registered_user):
+    response = asyncio.run(call("POST", "/login", content=LOGIN_BODY))
+    assert response.status_code == 200, response.text
+    return parse_json(response)["access_token"]
+
+
+def test_register(registered_user):
+    assert registered_user["email"] == TEST_EMAIL
+
+
+def test_login(access_token):
+    assert access_token
+
+
+def test_log_entry(access_token):
+    response = asyncio.run(call("POST", "/log", access_token, content=LOG_BODY))
+    assert response.status_code == 200, response.text
+    assert parse_json(response)["metric"] == LOG_DATA["metric"]
+
+
+def test_journal(access_token):
+    response = asyncio.run(call("POST", "/journal", access_token, content=JOURNAL_BODY))
+    assert response.status_code == 200, response.text
+    assert parse_json(response)["value"] == JOURNAL_DATA["mood_score"]
+
+
+def test_get_logs(access_token):
+    response = asyncio.run(call("GET", "/logs", access_token))
+    assert response.status_code == 200, response.text
+    assert isinstance(parse_json(response), list)
+
+
+def test_get_insights(access_token):
+    response = asyncio.run(call("GET", "/insights", access_token))
+    assert response.status_code == 200, response.text
+    assert isinstance(parse_json(response), list)
+
 
 if __name__ == "__main__":
-    test_api() 
\ No newline at end of file
+    configure_logging()
+    asyncio.run(run_tests())
@@ -37,6 +37,7 @@ CREATE TABLE correlation_insights (
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     description TEXT NOT NULL,
     correlation_score FLOAT NOT NULL,
+    metric_pair_key VARCHAR(511),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -45,12 +46,15 @@ CREATE TABLE journal_summaries (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     date DATE NOT NULL,
-    summary_text TEXT NOT NULL
+    summary_text TEXT NOT NULL,
+    content_hash VARCHAR(32)
 );
 
 -- Performance indexes
-CREATE INDEX idx_log_entries_user_date ON log_entries(user_id, date);
+CREATE INDEX idx_log_entries_user_date_metric ON log_entries(user_id, date, domain, metric) INCLUDE (value);
 CREATE INDEX idx_journal_summaries_user_date ON journal_summaries(user_id, date);
+CREATE UNIQUE INDEX uq_correlation_insights_user_pair ON correlation_insights(user_id, metric_pair_key);
+CREATE UNIQUE INDEX uq_journal_summaries_user_hash_date ON journal_summaries(user_id, content_hash, date);
 
 -- Additional useful indexes
 CREATE INDEX idx_log_entries_domain ON log_entries(domain);